@@ -0,0 +1,110 @@
+"""
+Benchmarks for the eigensolver backends of nmrmath.block_simsignals.
+
+For *n* random spins, the spectrum is computed one Mz block at a time
+with three eigensolvers:
+
+* dense: all eigenpairs of each block with ``numpy.linalg.eigh`` (the
+  default);
+* krylov: the 50 lowest eigenpairs of each sparse block by Lanczos
+  (``nmrmath.krylov_eigensolver``);
+* lobpcg: the 20 lowest eigenpairs of each sparse block
+  (``nmrmath.lobpcg_eigensolver``).
+
+For each, the time for ``block_simsignals`` and the largest eigenvalue
+error (Hz, against the dense eigenvalues of each block, while the dense
+path is still practical) or eigenpair residual |Hv - Ev| are reported.
+Results on a single-core machine::
+
+    n  dense (s)  krylov (s)  error    lobpcg (s)  error
+    8  0.0031     0.011       1.8e-12  0.0049      1.1e-12
+    10 0.026      0.074       5.0e-12  0.27        3.5e-12
+    12 0.57       0.27        1.2e-11  0.81        1.0e-11
+    14 30         1.2         2.8e-11  2.5         4.9e-11
+    16 -          9.4         2.8e-11  11          6.3e-05
+
+(at 16 spins, the errors are residuals).
+
+The iterative solvers return only some of the eigenpairs of each block,
+and therefore only part of the spectrum. The largest block of 16 spins
+(12870 states) is far too large for a dense ``eigh`` in any reasonable
+time, but the iterative solvers only need sparse products with it.
+
+Usage (from the repository root)::
+
+    python -m benchmarks.bench_eigensolvers
+"""
+import time
+
+import numpy as np
+
+from benchmarks.bench_simsignals import random_spin_system
+from nmrtools.nmrmath import (_block_hamiltonian, _block_positions,
+                              _symmetrized_couplings, block_simsignals,
+                              krylov_eigensolver, lobpcg_eigensolver,
+                              mz_blocks)
+
+# Largest system for which the dense path is timed.
+DENSE_MAX_SPINS = 14
+
+
+def timed(func):
+    """Returns the result of `func` and the time it took in seconds."""
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def sparse_blocks(freqs, J):
+    """Returns the Mz blocks of the spin Hamiltonian as sparse matrices."""
+    nspins = len(freqs)
+    J = _symmetrized_couplings(J)
+    blocks = mz_blocks(nspins)
+    position = _block_positions(blocks, nspins)
+    return [_block_hamiltonian(freqs, J, states, nspins, position,
+                               sparse=True)
+            for states in blocks]
+
+
+def eigen_error(blocks, solver, references):
+    """
+    Returns the largest eigenvalue error of `solver` over all blocks against
+    their sorted `references` eigenvalues, or its largest residual
+    |Hv - Ev| if there are no reference eigenvalues.
+    """
+    errors = []
+    for H, reference in zip(blocks, references):
+        E, V = solver(H)
+        if reference is None:
+            errors.append(np.abs(H.dot(V) - V * E).max())
+            continue
+        errors.append(np.abs(reference - E[:, np.newaxis]).min(axis=1)
+                      .max())
+    return max(errors)
+
+
+def main(spin_counts=(8, 10, 12, 14, 16)):
+    print('n  dense (s)  krylov (s)  error    lobpcg (s)  error')
+    for nspins in spin_counts:
+        freqs, J = random_spin_system(nspins)
+        blocks = sparse_blocks(freqs, J)
+        krylov = krylov_eigensolver(50)
+        lobpcg = lobpcg_eigensolver(20)
+        if nspins <= DENSE_MAX_SPINS:
+            _, t_dense = timed(lambda: block_simsignals(freqs, J))
+            references = [np.linalg.eigvalsh(H.toarray()) for H in blocks]
+            dense = '{:<10.2g}'.format(t_dense)
+        else:
+            references = [None] * len(blocks)
+            dense = '-         '
+        _, t_krylov = timed(lambda: block_simsignals(freqs, J,
+                                                     eigensolver=krylov))
+        _, t_lobpcg = timed(lambda: block_simsignals(freqs, J,
+                                                     eigensolver=lobpcg))
+        print('{:<2} {} {:<11.2g} {:.1e}  {:<11.2g} {:.1e}'.format(
+            nspins, dense, t_krylov, eigen_error(blocks, krylov, references),
+            t_lobpcg, eigen_error(blocks, lobpcg, references)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmarks for the transition-intensity kernels used by nmrmath.simsignals.
+
+Given the eigenvectors V of a full spin Hamiltonian, the transition
+intensities are the squares of V.T * T * V, where T is the matrix of allowed
+transitions. Three ways of computing them are timed:
+
+* dense: T as a dense array, so both products are BLAS matrix products;
+* csr: T as the cached ``transition_matrix`` CSR matrix;
+* sector: only the <i|F-|j> elements between eigenvectors of adjacent Mz
+  blocks (``nmrmath._sector_signals``).
+
+The timings determine ``nmrmath._DENSE_TRANSITION_MAX_SPINS`` and
+``nmrmath._SECTOR_MIN_SPINS``. Results on a single-core machine (seconds per
+call)::
+
+    n  dense     csr       sector
+    2  6.9e-06   1.2e-05   1.5e-04
+    3  5.6e-06   8.1e-06   2.1e-04
+    4  5.5e-06   1.0e-05   2.3e-04
+    5  7.3e-06   1.4e-05   2.9e-04
+    6  2.9e-05   3.6e-05   3.5e-04
+    7  2.0e-04   1.5e-04   5.3e-04
+    8  1.6e-03   1.1e-03   1.1e-03
+    9  1.2e-02   8.7e-03   3.3e-03
+    10 9.3e-02   4.8e-02   9.5e-03
+    11 6.0e-01   3.4e-01   4.8e-02
+
+i.e. the dense BLAS path wins up to 6 spins, the CSR path for 7-8 spins,
+and the sector kernel from 9 spins. The dense and CSR paths are still used
+for larger systems if degenerate eigenvectors mix Mz blocks.
+
+Usage (from the repository root)::
+
+    python -m benchmarks.bench_simsignals
+"""
+import timeit
+
+import numpy as np
+
+from nmrtools.nmrmath import (_mz_sectors, _sector_signals, hamiltonian,
+                              bitwise_hamiltonian, transition_matrix)
+
+
+def random_spin_system(nspins, seed=0):
+    """
+    Creates reproducible random frequencies (Hz) and couplings (Hz) for
+    `nspins` nuclei.
+    """
+    rng = np.random.RandomState(seed)
+    freqs = rng.uniform(0, 1000, nspins)
+    J = rng.uniform(-15, 15, (nspins, nspins))
+    J = J + J.T
+    np.fill_diagonal(J, 0)
+    return freqs, J
+
+
+def dense_kernel(V, nspins):
+    T = transition_matrix(2 ** nspins).toarray()
+    return np.square(V.T.dot(T.dot(V)))
+
+
+def csr_kernel(V, nspins):
+    T = transition_matrix(2 ** nspins)
+    return np.square(V.T.dot(T.dot(V)))
+
+
+def sector_kernel(E, V, nspins):
+    return _sector_signals(E, V, nspins, _mz_sectors(V, nspins), 0.01)
+
+
+def best_time(func, repeat=3):
+    """Returns the best per-call time of `func` in seconds."""
+    number = 1
+    while timeit.timeit(func, number=number) < 0.2 and number < 10 ** 5:
+        number *= 10
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def main(max_spins=11):
+    print('n  dense     csr       sector')
+    crossover = None
+    for nspins in range(2, max_spins + 1):
+        freqs, J = random_spin_system(nspins)
+        H = (hamiltonian(freqs, J) if nspins <= 8
+             else bitwise_hamiltonian(freqs, J))
+        E, V = np.linalg.eigh(np.asarray(H))
+        t_dense = best_time(lambda: dense_kernel(V, nspins))
+        t_csr = best_time(lambda: csr_kernel(V, nspins))
+        t_sector = best_time(lambda: sector_kernel(E, V, nspins))
+        print('{:<2} {:.1e}   {:.1e}   {:.1e}'.format(
+            nspins, t_dense, t_csr, t_sector))
+        if crossover is None and t_csr < t_dense:
+            crossover = nspins
+    print('csr is faster than dense from {} spins'.format(crossover))
+
+
+if __name__ == '__main__':
+    main()
@@ -5,13 +5,20 @@ nmrtools
 The nmrtools package provides tools for simulating nuclear magnetic resonance
 (NMR) spectra.
 
-The overall API has not been settled on. Currently, there are two modules:
+The overall API has not been settled on. Currently, there are five modules:
 
 * nmrmath: provides functions for calculating spectral parameters
 * nmrplot: provides functions for converting calculation results to lineshapes
   and plotting the results.
+* cache: provides an opt-in cache for the results of nmrmath calculations.
+* parallel: runs independent nmrmath calculations in worker processes.
+* tables: provides tabulated, vectorized versions of the AB, AB2, ABX and
+  AA'XX' patterns.
 
 TODO: Elaborate.
 """
 from . import nmrmath
 from . import nmrplot
+from . import cache
+from . import parallel
+from . import tables
@@ -0,0 +1,173 @@
+"""
+Provides an opt-in cache for the results of second-order calculations.
+
+Repeated ``nmrmath.nspinspec`` calls for the same spin system (e.g. popular
+molecules requested over and over by a web front end) can be answered from a
+``SpectrumCache`` instead of being recomputed::
+
+    cache = SpectrumCache(directory='/var/cache/nmrtools')
+    spectrum = nspinspec(freqs, couplings, cache=cache)
+
+The cache has two tiers:
+
+* an in-memory LRU tier, limited by the total size (in bytes) of the cached
+  spectra;
+* an optional on-disk tier of .npy files in a directory, which are
+  memory-mapped when read. Because the files are named by the canonical key
+  of the spin system, any process using the same directory shares them.
+
+Spectra returned by the cache (and by ``nspinspec`` when given a cache,
+whether or not the result was already cached) are read-only.
+"""
+import hashlib
+import os
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+
+from .nmrmath import Spectrum
+
+
+class SpectrumCache:
+    """
+    A two-tier (memory LRU, optional memory-mapped disk) cache of spectra
+    keyed by spin-system parameters.
+
+    Arguments
+    ---------
+    max_bytes : int
+        the maximum total size of the spectra held in memory. The least
+        recently used spectra are evicted first.
+    directory : str or None
+        the directory for the on-disk tier (created if necessary), or None
+        for a memory-only cache.
+    tolerance : float
+        frequencies and couplings (Hz) are rounded to multiples of
+        `tolerance` before hashing, so spin systems that differ by less than
+        this (and round to the same values) share a cache entry.
+    """
+
+    def __init__(self, max_bytes=2 ** 26, directory=None, tolerance=1e-6):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.tolerance = tolerance
+        self.nbytes = 0
+        self._memory = OrderedDict()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def key(self, freqs, couplings, spins=None, **options):
+        """
+        Computes the canonical hash key for a spin system.
+
+        Spins are put in order of (rounded) frequency, and the couplings are
+        symmetrized and reordered to match, so that simple relabelings of
+        the nuclei map to the same key.
+
+        Arguments
+        ---------
+        freqs : [float...]
+            a list of *n* nuclei frequencies in Hz.
+        couplings : array-like
+            an *n, n* array of couplings in Hz.
+        spins : [float...] or None
+            the spin quantum number of each nucleus, or None if they are all
+            1/2. They are reordered along with the frequencies.
+        **options
+            any other arguments that affect the result (e.g. normalize).
+
+        Returns
+        -------
+        str
+            a hexadecimal hash key.
+        """
+        v = self._quantize(freqs)
+        J = np.asarray(couplings, dtype=float)
+        J = self._quantize((J + J.T) / 2)
+        order = np.argsort(v, kind='mergesort')
+        J = J[np.ix_(order, order)]
+        digest = hashlib.sha1()
+        digest.update(np.int64(len(v)).tobytes())
+        digest.update(v[order].tobytes())
+        digest.update(J[np.triu_indices(len(v), 1)].tobytes())
+        if spins is not None:
+            digest.update(b'spins')
+            digest.update(np.asarray(spins, dtype=float)[order].tobytes())
+        digest.update(repr(sorted(options.items())).encode())
+        return digest.hexdigest()
+
+    def _quantize(self, values):
+        values = np.asarray(values, dtype=float)
+        return np.round(values / self.tolerance).astype(np.int64)
+
+    def get(self, key):
+        """
+        Looks up a spectrum, first in memory and then on disk.
+
+        Returns
+        -------
+        Spectrum or None
+            the cached spectrum, or None if `key` is not cached.
+        """
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return Spectrum(self._memory[key])
+        path = self._path(key)
+        if path is None or not os.path.exists(path):
+            return None
+        peaks = np.load(path, mmap_mode='r')
+        self._remember(key, peaks)
+        return Spectrum(peaks)
+
+    def put(self, key, spectrum):
+        """
+        Stores a spectrum in memory and, if enabled, on disk.
+
+        Returns
+        -------
+        Spectrum
+            the stored, read-only spectrum.
+        """
+        peaks = np.array(Spectrum(spectrum).peaks)
+        peaks.flags.writeable = False
+        path = self._path(key)
+        if path is not None and not os.path.exists(path):
+            # Write to a temporary file first so that other processes never
+            # see a partly written file.
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, peaks)
+            os.replace(tmp, path)
+        self._remember(key, peaks)
+        return Spectrum(peaks)
+
+    def clear(self):
+        """
+        Empties the in-memory tier (the on-disk tier is left untouched).
+        """
+        self._memory.clear()
+        self.nbytes = 0
+
+    def _path(self, key):
+        if self.directory is None:
+            return None
+        return os.path.join(self.directory, key + '.npy')
+
+    def _remember(self, key, peaks):
+        if key in self._memory:
+            self.nbytes -= self._memory.pop(key).nbytes
+        if peaks.nbytes > self.max_bytes:
+            return
+        self._memory[key] = peaks
+        self.nbytes += peaks.nbytes
+        while self.nbytes > self.max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+
+    def __contains__(self, key):
+        return key in self._memory or (
+            self._path(key) is not None and os.path.exists(self._path(key)))
+
+    def __len__(self):
+        return len(self._memory)
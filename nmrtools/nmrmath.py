@@ -19,11 +19,138 @@ Brown, K.C.; Tyson, R. L.; Weil, J. A. *J. Chem. Educ.* **1998**, *75*, 1632.
 the last term is minus-over-plus, not plus-over-minus.)
 """
 
+import heapq
 import numpy as np
+from collections.abc import Iterable, Sized
+from functools import lru_cache
+from itertools import chain, product
+from operator import itemgetter
 from math import sqrt
 
 from scipy.linalg import eigh
-from scipy.sparse import kron, csc_matrix, csr_matrix, lil_matrix, bmat
+from scipy.special import binom, comb, jv
+from scipy.sparse import (coo_matrix, csc_matrix, csr_matrix, identity,
+                          issparse, tril)
+from scipy.sparse.csgraph import connected_components
+from scipy.sparse.linalg import eigsh, lobpcg
+
+##############################################################################
+# Spectrum representation
+##############################################################################
+
+# Number of rows that iterating over a Spectrum converts to Python tuples at
+# a time.
+_ITER_CHUNK_SIZE = 256
+
+
+class Spectrum:
+    """
+    A compact representation of a spectrum (a list of signals).
+
+    The signals are stored in a single (n, 2) float64 array of (frequency,
+    intensity) rows, so large spectra carry no per-peak Python objects.
+    For compatibility with code written for plist-style spectra, a Spectrum
+    also behaves like a list of (frequency, intensity) tuples: iterating over
+    it, indexing it with an integer, ``len``, ``sort``, ``+`` and ``==`` all
+    work as they would for a list, and ``tolist`` returns the equivalent
+    list of tuples. NumPy functions accept a Spectrum directly.
+
+    Arguments
+    ---------
+    peaks : array-like or iterable
+        a Spectrum, a list (or any iterable, e.g. a generator) of
+        (frequency, intensity) tuples, or an (n, 2) array.
+    """
+    __slots__ = ('peaks',)
+
+    def __init__(self, peaks=()):
+        if isinstance(peaks, Spectrum):
+            peaks = peaks.peaks
+        elif isinstance(peaks, Iterable) and not isinstance(peaks, Sized):
+            # e.g. a generator (such as merge_sorted_peaks), which
+            # np.asarray would not unpack
+            peaks = np.fromiter(chain.from_iterable(peaks), dtype=float)
+        self.peaks = np.asarray(peaks, dtype=float).reshape(-1, 2)
+
+    @classmethod
+    def from_columns(cls, frequencies, intensities):
+        """
+        Creates a Spectrum from separate sequences of frequencies and
+        intensities.
+        """
+        return cls(np.column_stack((np.asarray(frequencies, dtype=float),
+                                    np.asarray(intensities, dtype=float))))
+
+    @property
+    def frequencies(self):
+        """The signal frequencies (a view of the first column)."""
+        return self.peaks[:, 0]
+
+    @property
+    def intensities(self):
+        """The signal intensities (a view of the second column)."""
+        return self.peaks[:, 1]
+
+    def tolist(self):
+        """Returns the spectrum as a list of (frequency, intensity) tuples."""
+        return list(self)
+
+    def sort(self):
+        """
+        Sorts the signals in place by frequency (then intensity), like
+        ``list.sort`` does for a list of tuples.
+        """
+        self.peaks = self.peaks[np.lexsort((self.intensities,
+                                            self.frequencies))]
+
+    def __array__(self, dtype=None, copy=None):
+        if copy:
+            return np.array(self.peaks, dtype=dtype)
+        return np.asarray(self.peaks, dtype=dtype)
+
+    def __len__(self):
+        return len(self.peaks)
+
+    def __iter__(self):
+        # Rows are converted a chunk at a time, so that iterators over many
+        # spectra (e.g. in merge_sorted_peaks) do not each hold a full copy
+        # of their spectrum as Python objects.
+        peaks = self.peaks
+        for start in range(0, len(peaks), _ITER_CHUNK_SIZE):
+            yield from map(tuple,
+                           peaks[start:start + _ITER_CHUNK_SIZE].tolist())
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return tuple(self.peaks[index].tolist())
+        return Spectrum(self.peaks[index])
+
+    def __add__(self, other):
+        try:
+            other = Spectrum(other)
+        except (TypeError, ValueError):
+            return NotImplemented
+        return Spectrum(np.concatenate((self.peaks, other.peaks)))
+
+    def __radd__(self, other):
+        try:
+            other = Spectrum(other)
+        except (TypeError, ValueError):
+            return NotImplemented
+        return Spectrum(np.concatenate((other.peaks, self.peaks)))
+
+    def __eq__(self, other):
+        try:
+            other = Spectrum(other)
+        except (TypeError, ValueError):
+            return NotImplemented
+        return np.array_equal(self.peaks, other.peaks)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'Spectrum({!r})'.format(self.tolist())
+
 
 ##############################################################################
 # Second-order, Quantum Mechanics routines
@@ -61,181 +188,1438 @@ def is_allowed(m=0, n=0):
         | .
         | 7 = 111 = beta-beta-beta
 
-    For a transition to be allowed, the total spin of the system cannot
-    change by more than one. This corresponds to only one bit being flipped
-    in the binary number representation. The Hamming weight is the number of
-    bits flipped.
+    For a transition to be allowed, the total spin of the system cannot
+    change by more than one. This corresponds to only one bit being flipped
+    in the binary number representation. The Hamming weight is the number of
+    bits flipped.
+
+    Arguments
+    ---------
+    m, n : int
+
+    Returns
+    -------
+    bool
+        `true` = allowed, `false` = forbidden
+
+    """
+    return popcount(m ^ n) == 1
+
+
+@lru_cache(maxsize=32)
+def transition_matrix(n):
+    """
+    Creates a matrix of allowed transitions.
+
+    The integers 0-`n`, in their binary form, code for a spin state
+    (alpha/beta). The (i,j) cells in the matrix indicate whether a transition
+    from spin state i to spin state j is allowed or forbidden.
+    See the ``is_allowed`` function for more information.
+
+    Since an allowed transition flips exactly one bit, the allowed partners
+    of state i are simply i XOR 2^k, and the matrix is generated with array
+    operations in O(n log n) time. Results are cached per `n`, so the
+    returned matrix is shared between callers, and is read-only.
+
+    Arguments
+    ---------
+    n : dimension of the n,n matrix (i.e. number of possible spin states).
+
+    Returns
+    -------
+    csr_matrix
+        a transition matrix that can be used to compute the intensity of
+    allowed transitions.
+    """
+    states = np.arange(n)
+    flips = 1 << np.arange(max(n - 1, 0).bit_length())
+    rows = np.repeat(states, len(flips))
+    cols = (states[:, np.newaxis] ^ flips).ravel()
+    allowed = cols < n
+    T = csr_matrix((np.ones(np.count_nonzero(allowed)),
+                    (rows[allowed], cols[allowed])),
+                   shape=(n, n))
+    for array in (T.data, T.indices, T.indptr):
+        array.flags.writeable = False
+    return T
+
+
+def _spin_terms(states, nspins):
+    """
+    Computes the parts of the spin Hamiltonian for a set of spin states that
+    depend only on the bit patterns of the state numbers.
+
+    The Zeeman and J*Iz*Iz terms are diagonal, and the only off-diagonal
+    elements are the J/2 "flip-flop" terms between states that differ by
+    exchanging the alpha/beta states of two nuclei, so a Hamiltonian is a
+    weighted sum of these terms.
+
+    Arguments
+    ---------
+    states : ndarray
+        the spin state numbers (must be closed under flip-flops, e.g. all
+        states or an Mz block).
+    nspins : int
+        the number of spins.
+
+    Returns
+    -------
+    (ndarray, ndarray, ndarray, ndarray, ndarray, ndarray, ndarray)
+        the Iz diagonals (a states x spins array); the Iz*Iz diagonals (a
+        states x pairs array); the row and column indices of the pairs k < l;
+        and the row indices (into `states`), partner spin state numbers and
+        pair numbers of the flip-flop elements.
+    """
+    bits = _spin_bits(states, nspins)
+    Iz = 0.5 - bits
+    k, l = np.triu_indices(nspins, 1)
+    IzIz = Iz[:, k] * Iz[:, l]
+    flip_rows, flip_pairs = np.nonzero(bits[:, k] != bits[:, l])
+    partners = states[flip_rows] ^ ((1 << (nspins - 1 - k[flip_pairs]))
+                                    | (1 << (nspins - 1 - l[flip_pairs])))
+    return Iz, IzIz, k, l, flip_rows, partners, flip_pairs
+
+
+@lru_cache(maxsize=32)
+def _operator_terms(nspins):
+    """
+    Precomputes the parts of the spin Hamiltonian for `nspins` spin-1/2
+    nuclei that depend only on the number of spins (see ``_spin_terms``).
+
+    Results are cached per `nspins` and are read-only.
+
+    Returns
+    -------
+    (ndarray, ndarray, ndarray, ndarray, ndarray, ndarray, ndarray)
+        the Iz diagonals (a states x spins array); the Iz*Iz diagonals (a
+        states x pairs array); the row and column indices of the pairs k < l;
+        and the rows, columns and pair numbers of the flip-flop elements.
+    """
+    terms = _spin_terms(np.arange(2 ** nspins), nspins)
+    for term in terms:
+        term.flags.writeable = False
+    return terms
+
+
+def hamiltonian(freqlist, couplings, dtype=np.float64):
+    """
+    Computes the spin Hamiltonian for `n` spin-1/2 nuclei.
+
+    The spin operator structure for `n` nuclei is computed once and cached
+    (see ``_operator_terms``), so repeated calls with the same number of
+    nuclei (e.g. from an interactive parameter slider) only form the
+    weighted sum of the cached terms.
+
+    Arguments
+    ---------
+    freqlist : array-like
+        a list of frequencies in Hz of length `n`
+    couplings : array-like
+        an `n` x `n` array of coupling constants in Hz
+    dtype : numpy dtype
+        the dtype of the result, e.g. numpy.float32 to halve its memory.
+
+    Returns
+    -------
+    ndarray
+        a 2-D array for the spin Hamiltonian
+    """
+    freqs = np.asarray(freqlist, dtype=float)
+    J = np.asarray(couplings, dtype=float)
+    Iz, IzIz, k, l, flip_rows, flip_cols, flip_pairs = _operator_terms(
+        len(freqs))
+
+    # The J*I(k).I(l) terms for both (k, l) and (l, k) add up to an
+    # effective coupling of (J[k, l] + J[l, k]) / 2 per pair; self-couplings
+    # J[k, k] * I(k).I(k) / 2 = 3/8 * J[k, k] only shift all energies.
+    pair_J = (J[k, l] + J[l, k]) / 2
+    H = np.diag((Iz.dot(freqs) + IzIz.dot(pair_J)
+                 + 0.375 * np.trace(J)).astype(dtype))
+    H[flip_rows, flip_cols] = 0.5 * pair_J[flip_pairs]
+    return H
+
+
+def _spin_bits(states, nspins):
+    """
+    Decodes spin states into their individual spin (bit) values.
+
+    The first spin in a spin system is the most significant bit of the state
+    number, matching the Kronecker product order used by ``hamiltonian``.
+
+    Arguments
+    ---------
+    states : array-like of int
+        the spin state numbers to decode.
+    nspins : int
+        the number of spins in the spin system.
+
+    Returns
+    -------
+    ndarray
+        a (len(`states`), `nspins`) array of 0 (alpha) and 1 (beta) values.
+    """
+    shifts = np.arange(nspins - 1, -1, -1)
+    return (np.asarray(states)[:, np.newaxis] >> shifts) & 1
+
+
+def mz_blocks(nspins):
+    """
+    Partitions the 2^`nspins` spin states into blocks of constant total Mz.
+
+    The spin Hamiltonian commutes with the total Fz operator, so it has no
+    matrix elements between states in different blocks. Block *k* contains
+    the states with *k* beta spins (i.e. Mz = `nspins`/2 - *k*).
+
+    Arguments
+    ---------
+    nspins : int
+        the number of spin-1/2 nuclei.
+
+    Returns
+    -------
+    [ndarray...]
+        a list of `nspins` + 1 sorted arrays of spin state numbers.
+    """
+    states = np.arange(2 ** nspins)
+    nbeta = _spin_bits(states, nspins).sum(axis=1)
+    return [states[nbeta == k] for k in range(nspins + 1)]
+
+
+def _block_positions(blocks, nspins):
+    """
+    Maps every spin state number to its row/column index within its Mz block.
+    """
+    position = np.empty(2 ** nspins, dtype=int)
+    for block in blocks:
+        position[block] = np.arange(len(block))
+    return position
+
+
+def _hamiltonian_elements(freqs, couplings, states, nspins):
+    """
+    Computes the nonzero elements of the spin Hamiltonian for a set of spin
+    states directly from the bit patterns of the state numbers (see
+    ``_spin_terms``).
+
+    Arguments
+    ---------
+    freqs : ndarray
+        an array of *n* frequencies in Hz.
+    couplings : ndarray
+        a symmetric *n* x *n* array of couplings in Hz, with zero diagonal.
+    states : ndarray
+        the spin state numbers (must be closed under flip-flops, e.g. all
+        states or an Mz block).
+    nspins : int
+        the number of spins.
+
+    Returns
+    -------
+    (ndarray, ndarray, ndarray, ndarray)
+        the diagonal elements (in the order of `states`), and the row
+        indices (into `states`), column spin state numbers and values of the
+        off-diagonal elements.
+    """
+    Iz, IzIz, k, l, rows, partners, pairs = _spin_terms(states, nspins)
+    pair_J = couplings[k, l]
+    diagonal = Iz.dot(freqs) + IzIz.dot(pair_J)
+    coupled = pair_J[pairs] != 0
+    return (diagonal, rows[coupled], partners[coupled],
+            0.5 * pair_J[pairs[coupled]])
+
+
+def _block_hamiltonian(freqs, couplings, states, nspins, position,
+                       sparse=False):
+    """
+    Computes one Mz block of the spin Hamiltonian as a dense array (or a
+    ``csr_matrix``).
+
+    Arguments
+    ---------
+    freqs : ndarray
+        an array of *n* frequencies in Hz.
+    couplings : ndarray
+        a symmetric *n* x *n* array of couplings in Hz, with zero diagonal.
+    states : ndarray
+        the spin state numbers in the block.
+    nspins : int
+        the number of spins.
+    position : ndarray
+        maps spin state numbers to their index within their block.
+    sparse : bool
+        True if the block should be returned as a ``csr_matrix``.
+
+    Returns
+    -------
+    ndarray or csr_matrix
+        a 2-D array for the Hamiltonian block.
+    """
+    diagonal, rows, partners, values = _hamiltonian_elements(
+        freqs, couplings, states, nspins)
+    if sparse:
+        diagonal_indices = np.arange(len(states))
+        return coo_matrix(
+            (np.concatenate((diagonal, values)),
+             (np.concatenate((diagonal_indices, rows)),
+              np.concatenate((diagonal_indices, position[partners])))),
+            shape=(len(states), len(states))).tocsr()
+    H = np.diag(diagonal)
+    H[rows, position[partners]] = values
+    return H
+
+
+def bitwise_hamiltonian(freqlist, couplings, sparse=False):
+    """
+    Computes the spin Hamiltonian for `n` spin-1/2 nuclei directly from the
+    bit patterns of the basis state numbers.
+
+    No spin operator matrices are formed: the Zeeman/Iz*Iz diagonal and the
+    J flip-flop off-diagonal elements are written straight into the result.
+    Self-couplings (the diagonal of `couplings`) are ignored, so the result
+    differs from that of ``hamiltonian`` by the constant diagonal offset
+    0.375 * trace(`couplings`), which does not change the spectrum. Memory use is therefore proportional to the number of nonzero
+    elements, and with `sparse` = True, systems of 14+ spins fit easily in
+    memory.
+
+    Arguments
+    ---------
+    freqlist : array-like
+        a list of frequencies in Hz of length `n`
+    couplings : array-like
+        an `n` x `n` array of coupling constants in Hz
+    sparse : bool
+        True if the Hamiltonian should be returned as a ``csr_matrix``;
+        False (default) for a dense ndarray.
+
+    Returns
+    -------
+    ndarray or csr_matrix
+        a 2-D array for the spin Hamiltonian
+    """
+    freqs = np.asarray(freqlist, dtype=float)
+    nspins = len(freqs)
+    size = 2 ** nspins
+    states = np.arange(size)
+    diagonal, rows, cols, values = _hamiltonian_elements(
+        freqs, _symmetrized_couplings(couplings), states, nspins)
+    if sparse:
+        return coo_matrix(
+            (np.concatenate((diagonal, values)),
+             (np.concatenate((states, rows)), np.concatenate((states, cols)))),
+            shape=(size, size)).tocsr()
+    H = np.diag(diagonal)
+    H[rows, cols] = values
+    return H
+
+
+def _block_transitions(states, nspins, position, next_size, sparse=False):
+    """
+    Computes the matrix of allowed transitions from one Mz block (block *k*)
+    to the next (block *k* + 1).
+
+    Every allowed transition flips exactly one alpha spin to beta, i.e. it
+    sets one of the zero bits in the state number.
+
+    Returns
+    -------
+    ndarray or csr_matrix
+        a (len(`states`), `next_size`) array with 1 for allowed transitions;
+        a ``csr_matrix`` if `sparse` is True.
+    """
+    bits = _spin_bits(states, nspins)
+    rows, spins = np.nonzero(bits == 0)
+    cols = position[states[rows] | (1 << (nspins - 1 - spins))]
+    if sparse:
+        return csr_matrix((np.ones(len(rows)), (rows, cols)),
+                          shape=(len(states), next_size))
+    T = np.zeros((len(states), next_size))
+    T[rows, cols] = 1
+    return T
+
+
+def _symmetrized_couplings(couplings):
+    """
+    Returns the couplings as a symmetric float array with zero diagonal.
+
+    ``hamiltonian`` uses the average of J[i, j] and J[j, i] as the effective
+    coupling, and self-couplings only shift all energies equally.
+    """
+    J = np.asarray(couplings, dtype=float)
+    J = (J + J.T) / 2
+    np.fill_diagonal(J, 0)
+    return J
+
+
+def _window_pairs(E1, E2, window):
+    """
+    Finds the pairs of eigenstates of adjacent Mz blocks whose transition
+    frequency lies within a window.
+
+    Arguments
+    ---------
+    E1, E2 : ndarray
+        the (ascending) eigenvalues of the two blocks.
+    window : (float, float)
+        the minimum and maximum transition frequencies in Hz.
+
+    Returns
+    -------
+    (ndarray, ndarray)
+        the indices into `E1` and `E2` of the pairs.
+    """
+    vmin, vmax = window
+    # |E1[i] - E2[j]| is in the window if E2[j] is in either interval (or,
+    # if the window includes zero, in their union):
+    if vmin <= 0:
+        intervals = [(E1 - vmax, E1 + vmax)]
+    else:
+        intervals = [(E1 - vmax, E1 - vmin), (E1 + vmin, E1 + vmax)]
+    rows, cols = [], []
+    for a, b in intervals:
+        start = np.searchsorted(E2, a, side='left')
+        stop = np.searchsorted(E2, b, side='right')
+        counts = np.maximum(stop - start, 0)
+        first = np.cumsum(counts) - counts
+        rows.append(np.repeat(np.arange(len(E1)), counts))
+        cols.append(np.arange(counts.sum()) - np.repeat(first - start, counts))
+    return np.concatenate(rows), np.concatenate(cols)
+
+
+def _pair_intensities(V1, FV2, i, j):
+    """
+    Computes the intensities (V1.T * F * V2)[i, j] ** 2 of selected
+    transitions only, given the product F * V2.
+
+    When only a small fraction of all pairs is selected, the row-by-column
+    dot products are cheaper than the full matrix product.
+    """
+    if 16 * len(i) > V1.shape[1] * FV2.shape[1]:
+        return np.square(V1.T.dot(FV2))[i, j]
+    I = np.empty(len(i))
+    chunk = max(1, _BATCH_MEMORY // (8 * max(len(V1), 1)))
+    for start in range(0, len(i), chunk):
+        a, b = i[start:start + chunk], j[start:start + chunk]
+        I[start:start + chunk] = np.einsum('ij,ij->j', V1[:, a], FV2[:, b])
+    return np.square(I)
+
+
+def _eigh(H, dtype=np.float64, refine=True):
+    """
+    Computes the eigensolution of a real symmetric matrix in the given
+    precision.
+
+    With float32, the eigenvectors are computed in single precision. If
+    `refine` is True, the eigenvalues are then recomputed in double
+    precision as the Rayleigh quotients v.H.v / v.v of the single-precision
+    eigenvectors. Their error is second order in the eigenvector error, so
+    they are accurate to ~1e-9 Hz rather than ~1e-4 Hz, at the cost of one
+    sparse matrix product.
+
+    Arguments
+    ---------
+    H : ndarray
+        the (float64) matrix.
+    dtype : numpy dtype
+        the precision of the eigensolver.
+    refine : bool
+        True if single-precision eigenvalues should be refined.
+
+    Returns
+    -------
+    (ndarray, ndarray)
+        the (float64, ascending) eigenvalues and the eigenvectors (of
+        `dtype`).
+    """
+    if np.dtype(dtype) == np.float64:
+        return np.linalg.eigh(H)
+    E, V = np.linalg.eigh(np.asarray(H, dtype=dtype))
+    if not refine:
+        return E.astype(float), V
+    V64 = V.astype(float)
+    E = (np.einsum('ij,ij->j', V64, np.asarray(csr_matrix(H).dot(V64)))
+         / np.einsum('ij,ij->j', V64, V64))
+    order = np.argsort(E)
+    return E[order], V[:, order]
+
+
+def _block_signals(hamiltonians, transitions, intensity_cutoff, window=None,
+                   m_blocks=None, dtype=np.float64, refine=True):
+    """
+    Diagonalizes the Mz blocks of a spin Hamiltonian and computes the
+    allowed transitions between adjacent blocks.
+
+    Arguments
+    ---------
+    hamiltonians : [ndarray...]
+        the Hamiltonian blocks, in order of increasing number of lowered
+        spins.
+    transitions : callable
+        transitions(k) returns the matrix of F- elements from block *k* to
+        block *k* + 1.
+    intensity_cutoff : float
+        transitions with intensities at or below this value are omitted.
+    window : (float, float) or None
+        if given, only transitions with frequencies (Hz) in this range are
+        computed.
+    m_blocks : [ndarray...] or None
+        if given, the m values (a states x particles array) of the basis
+        states of each block.
+    dtype : numpy dtype
+        the precision of the eigensolutions: numpy.float64 (default) or
+        numpy.float32, which halves memory use and is faster, at a
+        frequency error of ~1e-7 times the largest energy.
+    refine : bool
+        with float32, True (default) if the eigenvalues should be refined
+        to float64 accuracy (see ``_eigh``).
+
+    Returns
+    -------
+    Spectrum or (Spectrum, ndarray, ndarray)
+        the (frequency, intensity) signals; and, if `m_blocks` is given, the
+        change in the expectation value of Iz of each particle for each
+        transition, and <Iz> of each particle for every eigenstate.
+    """
+    eigensolutions = [_eigh(H, dtype, refine) for H in hamiltonians]
+    return _eigen_block_signals(eigensolutions, transitions, intensity_cutoff,
+                                window, m_blocks)
+
+
+def _eigen_block_signals(eigensolutions, transitions, intensity_cutoff,
+                         window=None, m_blocks=None):
+    """
+    Computes the allowed transitions between adjacent Mz blocks from the
+    (E, V) eigensolutions of the blocks, with eigenvalues in ascending
+    order. See ``_block_signals`` for the other arguments.
+    """
+    peaks = []
+    changes = []
+    for k in range(len(eigensolutions) - 1):
+        E1, V1 = eigensolutions[k]
+        E2, V2 = eigensolutions[k + 1]
+        if window is None:
+            I = np.square(V1.T.dot(transitions(k).dot(V2)))
+            i, j = np.nonzero(I > intensity_cutoff)
+            I = I[i, j]
+        else:
+            i, j = _window_pairs(E1, E2, window)
+            I = _pair_intensities(V1, csr_matrix(transitions(k)).dot(V2),
+                                  i, j)
+            keep = I > intensity_cutoff
+            i, j, I = i[keep], j[keep], I[keep]
+        peaks.append(np.column_stack((np.abs(E1[i] - E2[j]), I)))
+        if m_blocks is not None:
+            Iz1 = np.square(V1).T.dot(m_blocks[k])
+            Iz2 = np.square(V2).T.dot(m_blocks[k + 1])
+            changes.append(Iz1[i] - Iz2[j])
+    if m_blocks is not None:
+        levels = [np.square(V).T.dot(m) for (_, V), m in zip(eigensolutions,
+                                                             m_blocks)]
+        return (Spectrum(np.concatenate(peaks)), np.concatenate(changes),
+                np.concatenate(levels))
+    return Spectrum(np.concatenate(peaks))
+
+
+def block_simsignals(freqs, couplings, intensity_cutoff=0.01, window=None,
+                     dtype=np.float64, refine=True, eigensolver=None):
+    """
+    Calculates the allowed transitions for *n* spin-1/2 nuclei by
+    diagonalizing the spin Hamiltonian one Mz block at a time.
+
+    The result is equivalent to ``simsignals(hamiltonian(freqs, couplings),
+    n)``, but instead of one eigensolution of the full 2^n x 2^n matrix,
+    *n* + 1 much smaller (binomial-sized) blocks are solved. Intensities are
+    only computed between adjacent blocks, since transitions are only
+    allowed between them.
+
+    Arguments
+    ---------
+    freqs : [float...]
+        a list of *n* nuclei frequencies in Hz.
+    couplings : array-like
+        an *n, n* array of couplings in Hz.
+    intensity_cutoff : float
+        transitions with intensities at or below this value are omitted.
+    window : (float, float) or None
+        if given, only the transitions with frequencies (Hz) in this range
+        are returned, and only their intensities are computed.
+    dtype : numpy dtype
+        the precision of the eigensolutions: numpy.float64 (default) or
+        numpy.float32, which halves memory use and is faster, at a
+        frequency error of ~1e-7 times the largest energy.
+    refine : bool
+        with float32, True (default) if the eigenvalues should be refined
+        to float64 accuracy (see ``_eigh``).
+    eigensolver : callable or None
+        if given, a function (e.g. from ``krylov_eigensolver`` or
+        ``lobpcg_eigensolver``) that is applied to each block, as a sparse
+        matrix, instead of a dense ``eigh`` (see ``simsignals``); `dtype`
+        and `refine` are then ignored. Blocks too large for a dense
+        ``eigh`` (from ~16 spins) are then never formed as dense arrays,
+        and only the transitions between the eigenpairs it returns are
+        computed.
+
+    Returns
+    -------
+    Spectrum
+        the (frequency, intensity) signals.
+    """
+    freqs = np.asarray(freqs, dtype=float)
+    nspins = len(freqs)
+    J = _symmetrized_couplings(couplings)
+    blocks = mz_blocks(nspins)
+    position = _block_positions(blocks, nspins)
+    sparse = eigensolver is not None
+    hamiltonians = [_block_hamiltonian(freqs, J, states, nspins, position,
+                                       sparse)
+                    for states in blocks]
+    if sparse:
+        eigensolutions = []
+        for H in hamiltonians:
+            E, V = eigensolver(H)
+            eigensolutions.append((E, np.asarray(V.real)))
+        return _eigen_block_signals(
+            eigensolutions,
+            lambda k: _block_transitions(blocks[k], nspins, position,
+                                         len(blocks[k + 1]), sparse=True),
+            intensity_cutoff, window)
+    return _block_signals(
+        hamiltonians,
+        lambda k: _block_transitions(blocks[k], nspins, position,
+                                     len(blocks[k + 1])),
+        intensity_cutoff, window, dtype=dtype, refine=refine)
+
+
+def _mixed_radix_basis(spins):
+    """
+    Builds the product basis for particles of arbitrary spin.
+
+    Each particle *k* of spin S_k has 2*S_k + 1 states, numbered by the digit
+    d_k = S_k - m_k (0 for the highest m). A basis state number is the
+    mixed-radix number of its digits, with the first particle most
+    significant; for spin-1/2 particles this is the bit numbering used by
+    ``mz_blocks``. Block *k* holds the states whose digits sum to *k*, i.e.
+    with Mz = sum(S) - *k*.
+
+    Arguments
+    ---------
+    spins : ndarray
+        the spin quantum number (0.5, 1, 1.5...) of each particle.
+
+    Returns
+    -------
+    (ndarray, ndarray, [ndarray...], ndarray)
+        the m values of every state (a states x particles array), the
+        stride of each particle's digit in the state number, the blocks of
+        state numbers, and the position of every state within its block.
+    """
+    sizes = np.rint(2 * spins).astype(int) + 1
+    strides = np.append(np.cumprod(sizes[:0:-1])[::-1], 1)
+    digits = np.indices(sizes).reshape(len(sizes), -1).T
+    total = digits.sum(axis=1)
+    blocks = [np.flatnonzero(total == k) for k in range(sizes.sum()
+                                                        - len(sizes) + 1)]
+    position = np.empty(len(digits), dtype=int)
+    for block in blocks:
+        position[block] = np.arange(len(block))
+    return spins - digits, strides, blocks, position
+
+
+def _ladder(spins, m, step):
+    """
+    Returns the matrix element of the raising (`step` = 1) or lowering
+    (`step` = -1) operator for spin(s) `spins` acting on state(s) `m`.
+    """
+    return np.sqrt(np.maximum(spins * (spins + 1) - m * (m + step), 0))
+
+
+def spin_operators(spins):
+    """
+    Builds the spin operators of each nucleus for nuclei of arbitrary spin
+    (e.g. 0.5 for 1H, 1 for 2H and 14N).
+
+    The operators are in the mixed-radix product basis of
+    ``_mixed_radix_basis``: with state numbers read as digits S - m (first
+    nucleus most significant), which for spin-1/2 nuclei is the binary
+    numbering used by ``hamiltonian``.
+
+    Arguments
+    ---------
+    spins : [float...]
+        the spin quantum number of each nucleus.
+
+    Returns
+    -------
+    ([csr_matrix...], [csr_matrix...], [csr_matrix...])
+        the Iz, I+ and I- operators of each nucleus.
+    """
+    spins = np.asarray(spins, dtype=float)
+    m, strides, _, _ = _mixed_radix_basis(spins)
+    size = len(m)
+    states = np.arange(size)
+    Iz, Iplus, Iminus = [], [], []
+    for k in range(len(spins)):
+        Iz.append(csr_matrix((m[:, k], (states, states)), shape=(size, size)))
+        lower = np.flatnonzero(m[:, k] > -spins[k])
+        Iminus.append(csr_matrix(
+            (_ladder(spins[k], m[lower, k], -1),
+             (lower + strides[k], lower)), shape=(size, size)))
+        Iplus.append(Iminus[k].T.tocsr())
+    return Iz, Iplus, Iminus
+
+
+def allowed_transitions(spins):
+    """
+    Lists the allowed (single-quantum) transitions for nuclei of arbitrary
+    spin.
+
+    A transition is allowed if it lowers the m of exactly one nucleus by 1,
+    i.e. if it lowers one digit of the state number (see
+    ``spin_operators``) by 1. All transitions are generated at once with
+    array operations; for spin-1/2 nuclei they are the transitions of
+    ``transition_matrix``.
+
+    Arguments
+    ---------
+    spins : [float...]
+        the spin quantum number of each nucleus.
+
+    Returns
+    -------
+    (ndarray, ndarray, ndarray)
+        the initial and final state numbers of each transition, and its
+        <final|I-|initial> matrix element.
+    """
+    spins = np.asarray(spins, dtype=float)
+    m, strides, _, _ = _mixed_radix_basis(spins)
+    states, nuclei = np.nonzero(m > -spins)
+    return (states, states + strides[nuclei],
+            _ladder(spins[nuclei], m[states, nuclei], -1))
+
+
+def spin_hamiltonian(freqs, couplings, spins):
+    """
+    Computes the spin Hamiltonian for *n* nuclei of arbitrary spin.
+
+    The Hamiltonian is assembled from its Mz blocks (see
+    ``_spin_block_hamiltonian``), in the basis of ``spin_operators``. For
+    spin-1/2 nuclei it equals ``hamiltonian``.
+
+    Arguments
+    ---------
+    freqs : [float...]
+        a list of *n* nuclei frequencies in Hz.
+    couplings : array-like
+        an *n, n* array of couplings in Hz.
+    spins : [float...]
+        the spin quantum number of each nucleus.
+
+    Returns
+    -------
+    ndarray
+        a 2-D array for the spin Hamiltonian.
+    """
+    freqs = np.asarray(freqs, dtype=float)
+    spins = np.asarray(spins, dtype=float)
+    J = _symmetrized_couplings(couplings)
+    m, strides, blocks, position = _mixed_radix_basis(spins)
+    H = np.zeros((len(m), len(m)))
+    for states in blocks:
+        H[np.ix_(states, states)] = _spin_block_hamiltonian(
+            freqs, J, spins, m, strides, states, position)
+    return H
+
+
+def _spin_block_hamiltonian(freqs, couplings, spins, m, strides, states,
+                            position):
+    """
+    Computes one Mz block of the spin Hamiltonian for particles of arbitrary
+    spin as a dense array.
+
+    The diagonal holds the Zeeman and J*Iz*Iz terms; the off-diagonal
+    elements are the J/2 * I+(k) * I-(l) flip-flop terms.
+    """
+    mb = m[states]
+    H = np.diag(mb.dot(freqs) + 0.5 * np.einsum('ij,jk,ik->i', mb, couplings,
+                                                mb))
+    for k, l in zip(*np.nonzero(couplings)):
+        r = np.flatnonzero((mb[:, k] < spins[k]) & (mb[:, l] > -spins[l]))
+        partners = states[r] - strides[k] + strides[l]
+        H[position[partners], r] = (0.5 * couplings[k, l]
+                                    * _ladder(spins[k], mb[r, k], 1)
+                                    * _ladder(spins[l], mb[r, l], -1))
+    return H
+
+
+def _spin_block_lowering(spins, m, strides, states, position, next_size):
+    """
+    Computes the matrix elements of the total lowering operator F- from one
+    Mz block to the next, for particles of arbitrary spin.
+
+    Returns
+    -------
+    ndarray
+        a (len(`states`), `next_size`) array of <j|F-|i> values.
+    """
+    mb = m[states]
+    rows, particles = np.nonzero(mb > -spins)
+    cols = position[states[rows] + strides[particles]]
+    F = np.zeros((len(states), next_size))
+    F[rows, cols] = _ladder(spins[particles], mb[rows, particles], -1)
+    return F
+
+
+def _spin_block_simsignals(freqs, couplings, spins, intensity_cutoff,
+                           window=None, magnetizations=False,
+                           dtype=np.float64, refine=True):
+    """
+    The equivalent of ``block_simsignals`` for particles of arbitrary spin.
+
+    Arguments
+    ---------
+    freqs : ndarray
+        the frequency of each particle in Hz.
+    couplings : ndarray
+        a symmetric array of couplings in Hz, with zero diagonal.
+    spins : ndarray
+        the spin quantum number of each particle.
+    intensity_cutoff : float
+        transitions with intensities at or below this value are omitted.
+    window : (float, float) or None
+        if given, only transitions with frequencies (Hz) in this range are
+        computed.
+    magnetizations : bool
+        True if the change in <Iz> of each particle for each transition, and
+        <Iz> of each particle for each eigenstate, should also be returned.
+    dtype, refine
+        the precision of the eigensolutions (see ``block_simsignals``).
+
+    Returns
+    -------
+    Spectrum or (Spectrum, ndarray, ndarray)
+        the (frequency, intensity) signals, and the <Iz> values if
+        requested.
+    """
+    m, strides, blocks, position = _mixed_radix_basis(spins)
+    hamiltonians = [_spin_block_hamiltonian(freqs, couplings, spins, m,
+                                            strides, states, position)
+                    for states in blocks]
+    return _block_signals(
+        hamiltonians,
+        lambda k: _spin_block_lowering(spins, m, strides, blocks[k],
+                                       position, len(blocks[k + 1])),
+        intensity_cutoff, window,
+        [m[states] for states in blocks] if magnetizations else None,
+        dtype, refine)
+
+
+def _equivalent_groups(freqs, couplings, spins=None):
+    """
+    Finds the groups of magnetically equivalent nuclei: nuclei with the same
+    frequency, spin and couplings to every other nucleus.
+
+    Arguments
+    ---------
+    freqs : ndarray
+        an array of *n* frequencies in Hz.
+    couplings : ndarray
+        a symmetric *n* x *n* array of couplings in Hz, with zero diagonal.
+    spins : ndarray or None
+        the spin quantum number of each nucleus (by default, all 1/2).
+
+    Returns
+    -------
+    [[int...]...]
+        the indices of the nuclei in each group (every nucleus is in exactly
+        one group).
+    """
+    nspins = len(freqs)
+    groups = []
+    grouped = np.zeros(nspins, dtype=bool)
+    for i in range(nspins):
+        if grouped[i]:
+            continue
+        group = [i]
+        for j in range(i + 1, nspins):
+            if grouped[j] or freqs[j] != freqs[i]:
+                continue
+            if spins is not None and spins[j] != spins[i]:
+                continue
+            others = np.ones(nspins, dtype=bool)
+            others[[i, j]] = False
+            if np.array_equal(couplings[i, others], couplings[j, others]):
+                group.append(j)
+                grouped[j] = True
+        groups.append(group)
+    return groups
+
+
+def _total_spins(nspins, spin=0.5):
+    """
+    Decomposes a group of `nspins` equivalent nuclei of spin `spin` into
+    total spin states.
+
+    The number of product states with M = M_max - k is the number of ways
+    the digits S - m of the nuclei add up to k; a total spin S = M_max - k
+    occurs as often as this number grows from k - 1 to k.
+
+    Returns
+    -------
+    [(float, int)...]
+        the total spin S values and the number of times each occurs, e.g.
+        [(1.5, 1), (0.5, 2)] for three spin-1/2 nuclei.
+    """
+    if spin == 0.5:
+        return [(nspins / 2 - k, comb(nspins, k, exact=True)
+                 - (comb(nspins, k - 1, exact=True) if k else 0))
+                for k in range(nspins // 2 + 1)]
+    counts = np.ones(1, dtype=np.int64)
+    for _ in range(nspins):
+        counts = np.convolve(counts, np.ones(int(round(2 * spin)) + 1,
+                                             dtype=np.int64))
+    return [(nspins * spin - k, int(counts[k] - (counts[k - 1] if k else 0)))
+            for k in range((len(counts) - 1) // 2 + 1)]
+
+
+def symmetric_simsignals(freqs, couplings, intensity_cutoff=0.01,
+                         window=None, dtype=np.float64, refine=True,
+                         spins=None):
+    """
+    Calculates the allowed transitions for *n* nuclei, treating each group
+    of magnetically equivalent nuclei as composite particles of definite
+    total spin.
+
+    Couplings within a group of equivalent nuclei do not affect the
+    spectrum, and the total spin of each group is conserved, so a group of
+    *m* nuclei (e.g. m = 9 for a t-butyl group) contributes one particle of
+    spin S for each of its total spin states instead of 2^m product states.
+    The spectrum is the sum of the spectra of all combinations of group
+    spins, weighted by how often each combination occurs.
+
+    Arguments
+    ---------
+    freqs : [float...]
+        a list of *n* nuclei frequencies in Hz.
+    couplings : array-like
+        an *n, n* array of couplings in Hz.
+    intensity_cutoff : float
+        transitions with intensities at or below this value are omitted.
+    window : (float, float) or None
+        if given, only transitions with frequencies (Hz) in this range are
+        computed.
+    dtype, refine
+        the precision of the eigensolutions (see ``block_simsignals``).
+    spins : [float...] or None
+        the spin quantum number of each nucleus (by default, all 1/2).
+
+    Returns
+    -------
+    Spectrum
+        the (frequency, intensity) signals. Degenerate transitions are
+        combined into one signal, so the result can have fewer (but not
+        differently placed) signals than ``block_simsignals``.
+    """
+    freqs = np.asarray(freqs, dtype=float)
+    J = _symmetrized_couplings(couplings)
+    spins = _spin_quantum_numbers(spins, len(freqs))
+    groups = _equivalent_groups(freqs, J, spins)
+    if len(groups) == len(freqs):
+        if spins is None:
+            return block_simsignals(freqs, J, intensity_cutoff, window,
+                                    dtype, refine)
+        return _spin_block_simsignals(freqs, J, spins, intensity_cutoff,
+                                      window, dtype=dtype, refine=refine)
+    return _group_signals(freqs, J, groups, intensity_cutoff, window, dtype,
+                          refine, spins)[0]
+
+
+def _spin_quantum_numbers(spins, nspins):
+    """
+    Validates the spin quantum numbers of `nspins` nuclei.
+
+    Returns
+    -------
+    ndarray or None
+        the spins as an array, or None if they are all 1/2 (so that the
+        faster spin-1/2 code can be used).
+    """
+    if spins is None:
+        return None
+    spins = np.asarray(spins, dtype=float)
+    if spins.shape != (nspins,):
+        raise ValueError('expected {} spin quantum numbers, got {}'
+                         .format(nspins, spins.shape))
+    if np.any(spins <= 0) or np.any(2 * spins != np.round(2 * spins)):
+        raise ValueError('spin quantum numbers must be positive multiples '
+                         'of 1/2')
+    if np.all(spins == 0.5):
+        return None
+    return spins
+
+
+def _group_signals(freqs, couplings, groups, intensity_cutoff, window=None,
+                   dtype=np.float64, refine=True, spins=None):
+    """
+    Simulates groups of magnetically equivalent nuclei as composite
+    particles (see ``symmetric_simsignals``).
+
+    Arguments
+    ---------
+    freqs : ndarray
+        an array of *n* frequencies in Hz.
+    couplings : ndarray
+        a symmetric *n* x *n* array of couplings in Hz, with zero diagonal.
+    groups : [[int...]...]
+        the indices of the nuclei in each group of equivalent nuclei.
+    intensity_cutoff : float
+        transitions with intensities at or below this value are omitted.
+    window : (float, float) or None
+        if given, only transitions with frequencies (Hz) in this range are
+        computed.
+    dtype, refine
+        the precision of the eigensolutions (see ``block_simsignals``).
+    spins : ndarray or None
+        the spin quantum number of each nucleus (by default, all 1/2).
+
+    Returns
+    -------
+    (Spectrum, ndarray, ndarray, ndarray)
+        the (frequency, intensity) signals; the change in <Iz> of each
+        group for each signal (a signals x groups array); and <Iz> of each
+        group for each eigenstate (a states x groups array) with the number
+        of times each eigenstate occurs.
+    """
+    representatives = [group[0] for group in groups]
+    freqs = freqs[representatives]
+    J = couplings[np.ix_(representatives, representatives)]
+    group_spins = (np.full(len(groups), 0.5) if spins is None
+                   else spins[representatives])
+    peaks, changes, levels, counts = [], [], [], []
+    for combination in product(*(_total_spins(len(g), S)
+                                 for g, S in zip(groups, group_spins))):
+        totals = np.array([S for S, _ in combination])
+        weight = np.prod([count for _, count in combination])
+        active = totals > 0
+        if not active.any():
+            # a single state with no magnetization (e.g. a singlet pair)
+            levels.append(np.zeros((1, len(groups))))
+            counts.append(np.array([weight]))
+            continue
+        spectrum, dIz, Iz = _spin_block_simsignals(
+            freqs[active], J[np.ix_(active, active)], totals[active],
+            intensity_cutoff, window, magnetizations=True, dtype=dtype,
+            refine=refine)
+        peaks.append(spectrum.peaks * [1, weight])
+        change = np.zeros((len(spectrum), len(groups)))
+        change[:, active] = dIz
+        changes.append(change)
+        level = np.zeros((len(Iz), len(groups)))
+        level[:, active] = Iz
+        levels.append(level)
+        counts.append(np.full(len(Iz), weight))
+    return (Spectrum(np.concatenate(peaks)), np.concatenate(changes),
+            np.concatenate(levels), np.concatenate(counts))
+
+
+def _strong_clusters(freqs, couplings, ratio):
+    """
+    Partitions a spin system into clusters of strongly coupled nuclei.
+
+    Two nuclei are strongly coupled if |J| > `ratio` * |delta-v|; clusters
+    are the connected components of the graph of strong couplings.
+
+    Returns
+    -------
+    [ndarray...]
+        the indices of the nuclei in each cluster.
+    """
+    dv = np.abs(freqs[:, np.newaxis] - freqs)
+    strong = (couplings != 0) & (np.abs(couplings) > ratio * dv)
+    count, labels = connected_components(csr_matrix(strong), directed=False)
+    return [np.flatnonzero(labels == label) for label in range(count)]
+
+
+def _merge_coincident(spectrum, changes):
+    """
+    Combines signals with the same frequency and the same <Iz> changes (to
+    1e-6), adding their intensities.
+    """
+    key = np.round(np.column_stack((spectrum.frequencies, changes)), 6)
+    _, first, inverse = np.unique(key, axis=0, return_index=True,
+                                  return_inverse=True)
+    intensities = np.bincount(inverse.ravel(), weights=spectrum.intensities)
+    return (Spectrum.from_columns(spectrum.frequencies[first], intensities),
+            changes[first])
+
+
+def _split_by_cluster(spectrum, effective, levels, counts):
+    """
+    Applies the first-order splittings by the eigenstates of another
+    cluster to each signal.
 
     Arguments
     ---------
-    m, n : int
+    spectrum : Spectrum
+        the signals to split.
+    effective : ndarray
+        the effective coupling (Hz) of each signal to each group of the
+        other cluster (a signals x groups array).
+    levels : ndarray
+        <Iz> of each group for each eigenstate of the other cluster.
+    counts : ndarray
+        the number of times each eigenstate occurs.
 
     Returns
     -------
-    bool
-        `true` = allowed, `false` = forbidden
+    Spectrum
+        one signal per (signal, eigenstate) pair, in signal-major order.
+    """
+    if levels.shape == (2, 1):
+        # a single spin-1/2 nucleus: an ordinary first-order doublet
+        return doublet(spectrum, effective[:, 0])
+    shifts = effective.dot(levels.T)
+    return Spectrum.from_columns(
+        (spectrum.frequencies[:, np.newaxis] + shifts).ravel(),
+        np.outer(spectrum.intensities, counts / counts.sum()).ravel())
+
+
+def weak_coupling_simsignals(freqs, couplings, ratio, intensity_cutoff=0.01,
+                             symmetry=True, dtype=np.float64, refine=True,
+                             spins=None):
+    """
+    Calculates the allowed transitions for *n* nuclei, treating
+    weak couplings between clusters of strongly coupled nuclei to first
+    order (the X approximation).
+
+    Each cluster is simulated on its own (see ``_strong_clusters``). Every
+    signal of a cluster is then split by each other cluster it is coupled
+    to: one component for each eigenstate of the other cluster, shifted by
+    the sum of J * <Iz> (other cluster's nucleus, in that eigenstate) *
+    change in <Iz> (this cluster's nucleus, in the transition). When the
+    other cluster is a single nucleus, this is a ``doublet`` with a
+    transition-weighted effective J, which is simply J for a pure
+    single-spin transition.
+
+    Arguments
+    ---------
+    freqs : [float...]
+        a list of *n* nuclei frequencies in Hz.
+    couplings : array-like
+        an *n, n* array of couplings in Hz.
+    ratio : float
+        couplings with |J| <= `ratio` * |delta-v| are treated as weak. The
+        shifts are first order in the weak couplings, so the error is of
+        the order of `ratio` * |J|, or larger if a weak coupling is not
+        small compared to the splittings within a cluster.
+    intensity_cutoff : float
+        signals of each cluster with intensities at or below this value are
+        omitted.
+    symmetry : bool
+        True if groups of magnetically equivalent nuclei within a cluster
+        should be simulated as composite particles.
+    dtype, refine
+        the precision of the eigensolutions (see ``block_simsignals``).
+    spins : [float...] or None
+        the spin quantum number of each nucleus (by default, all 1/2).
 
+    Returns
+    -------
+    Spectrum
+        the (frequency, intensity) signals, with intensities on the same
+        scale as those of ``block_simsignals``.
     """
-    return popcount(m ^ n) == 1
+    freqs = np.asarray(freqs, dtype=float)
+    nspins = len(freqs)
+    J = _symmetrized_couplings(couplings)
+    spins = _spin_quantum_numbers(spins, nspins)
+    sizes = np.full(nspins, 2) if spins is None else 2 * spins + 1
+    if symmetry:
+        groups = _equivalent_groups(freqs, J, spins)
+    else:
+        groups = [[i] for i in range(nspins)]
+
+    clusters = []
+    for cluster in _strong_clusters(freqs, J, ratio):
+        members = set(cluster)
+        cluster_groups = [[i for i in g if i in members] for g in groups]
+        cluster_groups = [g for g in cluster_groups if g]
+        spectrum, dIz, levels, counts = _group_signals(
+            freqs, J, cluster_groups, intensity_cutoff, dtype=dtype,
+            refine=refine, spins=spins)
+        # Each cluster transition occurs once for every state of the other
+        # nuclei (2^(n - c) states for spin-1/2 nuclei).
+        others = np.ones(nspins, dtype=bool)
+        others[cluster] = False
+        spectrum = Spectrum.from_columns(
+            spectrum.frequencies,
+            spectrum.intensities * np.prod(sizes[others]))
+        clusters.append(([g[0] for g in cluster_groups], spectrum, dIz,
+                         levels, counts))
+
+    peaks = []
+    for c, (groups_c, spectrum, dIz, _, _) in enumerate(clusters):
+        for d, (groups_d, _, _, levels, counts) in enumerate(clusters):
+            effective = dIz.dot(J[np.ix_(groups_c, groups_d)])
+            if d == c or not effective.any():
+                continue
+            spectrum = _split_by_cluster(spectrum, effective, levels, counts)
+            spectrum, dIz = _merge_coincident(
+                spectrum, np.repeat(dIz, len(levels), axis=0))
+        peaks.append(spectrum.peaks)
+    return Spectrum(np.concatenate(peaks))
+
+
+# Kernel selection for simsignals (see benchmarks/bench_simsignals.py):
+# up to _DENSE_TRANSITION_MAX_SPINS spins, eigenvectors are multiplied by a
+# dense transition matrix (BLAS); above that, by the cached CSR matrix. From
+# _SECTOR_MIN_SPINS spins, only the elements between adjacent Mz blocks are
+# computed.
+_DENSE_TRANSITION_MAX_SPINS = 6
+_SECTOR_MIN_SPINS = 9
+
+
+def _mz_sectors(V, nspins):
+    """
+    Assigns each eigenvector of a full spin Hamiltonian to its Mz block.
+
+    Returns
+    -------
+    ndarray or None
+        the Mz block number of each eigenvector (column of `V`), or None if
+        any eigenvector is a mixture of different Mz blocks.
+    """
+    blocks = mz_blocks(nspins)
+    weights = np.array([np.square(V[states]).sum(axis=0) for states in blocks])
+    sectors = weights.argmax(axis=0)
+    # ~1e-8 for float64 eigenvectors, ~3e-4 for float32
+    purity = 1 - np.sqrt(np.finfo(V.dtype).eps)
+    if np.any(weights[sectors, np.arange(V.shape[1])] < purity):
+        return None
+    return sectors
 
 
-def transition_matrix(n):
+def _sector_signals(E, V, nspins, sectors, intensity_cutoff):
     """
-    Creates a matrix of allowed transitions.
+    Computes the allowed transitions of a full eigensolution whose
+    eigenvectors each belong to one Mz block.
 
-    The integers 0-`n`, in their binary form, code for a spin state
-    (alpha/beta). The (i,j) cells in the matrix indicate whether a transition
-    from spin state i to spin state j is allowed or forbidden.
-    See the ``is_allowed`` function for more information.
+    Only the elements <i|F-|j> between eigenvectors of adjacent blocks can
+    be nonzero, and each of those involves only the rows of V for the
+    states in the two blocks, so only those sub-products are computed.
+    """
+    blocks = mz_blocks(nspins)
+    position = _block_positions(blocks, nspins)
+    peaks = []
+    for k in range(nspins):
+        a = np.flatnonzero(sectors == k)
+        b = np.flatnonzero(sectors == k + 1)
+        T = _block_transitions(blocks[k], nspins, position, len(blocks[k + 1]))
+        I = np.square(V[np.ix_(blocks[k], a)].T.dot(T).dot(
+            V[np.ix_(blocks[k + 1], b)]))
+        i, j = np.nonzero(I > intensity_cutoff)
+        peaks.append(np.column_stack((np.abs(E[a[i]] - E[b[j]]), I[i, j])))
+    return Spectrum(np.concatenate(peaks))
+
+
+def krylov_eigensolver(nev, sigma=None, tol=0):
+    """
+    Creates an iterative (Lanczos) eigensolver for ``simsignals`` or
+    ``block_simsignals``, for Hamiltonians (or Mz blocks) too large for a
+    dense ``eigh``.
+
+    Only `nev` eigenpairs are computed with ``scipy.sparse.linalg.eigsh``:
+    those nearest the energy `sigma` (by shift-invert, which factorizes the
+    sparse H - sigma * I once), or the lowest ones if `sigma` is None. The
+    spectrum then contains only the transitions between these states.
+    Transitions connect states of adjacent Mz blocks, whose energies differ
+    by about one nuclear frequency, so `sigma` is usually a pair of
+    energies, e.g. E and E - v for signals near frequency v.
 
     Arguments
     ---------
-    n : dimension of the n,n matrix (i.e. number of possible spin states).
+    nev : int
+        the number of eigenpairs to compute (per `sigma` value).
+    sigma : float, [float...] or None
+        the energy (Hz) or energies the eigenpairs should be nearest to.
+        Eigenpairs found for more than one energy are only returned once.
+    tol : float
+        the relative accuracy of the eigenvalues (0 for machine precision).
 
     Returns
     -------
-    lil_matrix
-        a transition matrix that can be used to compute the intensity of
-    allowed transitions.
+    callable
+        a function of a (sparse or dense) Hamiltonian that returns its
+        eigenvalues in ascending order, and the eigenvectors.
     """
-    # function was optimized by only calculating upper triangle and then adding
-    # the lower.
-    T = lil_matrix((n, n))  # sparse matrix created
-    for i in range(n - 1):
-        for j in range(i + 1, n):
-            if is_allowed(i, j):
-                T[i, j] = 1
-    T = T + T.T
-    return T
+    def solve(H):
+        if nev >= H.shape[0] - 1:
+            # eigsh cannot compute all eigenpairs
+            return np.linalg.eigh(H.toarray() if issparse(H) else H)
+        if sigma is None:
+            E, V = eigsh(H, nev, which='SA', tol=tol)
+        else:
+            H = csc_matrix(H)
+            solutions = [_shift_invert_eigsh(H, nev, s, tol)
+                         for s in np.atleast_1d(sigma)]
+            E = np.concatenate([E for E, _ in solutions])
+            V = np.hstack([V for _, V in solutions])
+            E, V = _unique_eigenpairs(E, V)
+        order = np.argsort(E)
+        return E[order], V[:, order]
+    return solve
+
+
+def _shift_invert_eigsh(H, nev, sigma, tol):
+    """
+    Computes the `nev` eigenpairs of sparse H nearest `sigma` by
+    shift-invert Lanczos.
+    """
+    try:
+        return eigsh(H, nev, sigma=sigma, which='LM', tol=tol)
+    except RuntimeError:
+        # sigma is (numerically) an eigenvalue, e.g. the energy of a pure
+        # product state such as all-alpha, so H - sigma * I is singular
+        sigma += 1e-6 * max(1, abs(sigma))
+        return eigsh(H, nev, sigma=sigma, which='LM', tol=tol)
 
 
-def hamiltonian(freqlist, couplings):
+def _unique_eigenpairs(E, V):
     """
-    Computes the spin Hamiltonian for `n` spin-1/2 nuclei.
+    Removes repeated eigenpairs (eigenvectors that overlap an earlier one by
+    more than 1/2) from the combined results of several eigensolver runs.
+    """
+    overlaps = np.abs(V.T.dot(V))
+    keep = []
+    for i in range(len(E)):
+        if not keep or overlaps[keep, i].max() < 0.5:
+            keep.append(i)
+    return E[keep], V[:, keep]
+
+
+def lobpcg_eigensolver(nev, largest=False, tol=None, maxiter=500, seed=0):
+    """
+    Creates a LOBPCG eigensolver for ``simsignals`` or
+    ``block_simsignals``, which computes the `nev` lowest (or highest)
+    eigenpairs of a sparse Hamiltonian with ``scipy.sparse.linalg.lobpcg``.
+
+    LOBPCG needs only matrix products (no factorization), so it uses the
+    least memory, but it converges slowly for nearly degenerate
+    eigenvalues; see ``krylov_eigensolver`` for an alternative.
 
     Arguments
     ---------
-    freqlist : array-like
-        a list of frequencies in Hz of length `n`
-    couplings : array-like
-        an `n` x `n` array of coupling constants in Hz
+    nev : int
+        the number of eigenpairs to compute.
+    largest : bool
+        True for the highest eigenpairs, False (default) for the lowest.
+    tol : float or None
+        the residual tolerance (by default, chosen by LOBPCG).
+    maxiter : int
+        the maximum number of iterations.
+    seed : int
+        the seed for the random initial vectors, so results are
+        reproducible.
 
     Returns
     -------
-    ndarray
-        a 2-D array for the spin Hamiltonian
+    callable
+        a function of a (sparse or dense) Hamiltonian that returns its
+        eigenvalues in ascending order, and the eigenvectors.
     """
-    nspins = len(freqlist)
-
-    # Define Pauli matrices
-    sigma_x = np.matrix([[0, 1 / 2], [1 / 2, 0]])
-    sigma_y = np.matrix([[0, -1j / 2], [1j / 2, 0]])
-    sigma_z = np.matrix([[1 / 2, 0], [0, -1 / 2]])
-    unit = np.matrix([[1, 0], [0, 1]])
-
-    # The following empty arrays will be used to store the
-    # Cartesian spin operators.
-    Lx = np.empty((1, nspins), dtype='object')
-    Ly = np.empty((1, nspins), dtype='object')
-    Lz = np.empty((1, nspins), dtype='object')
-
-    for n in range(nspins):
-        Lx[0, n] = 1
-        Ly[0, n] = 1
-        Lz[0, n] = 1
-        for k in range(nspins):
-            if k == n:                                  # Diagonal element
-                Lx[0, n] = np.kron(Lx[0, n], sigma_x)
-                Ly[0, n] = np.kron(Ly[0, n], sigma_y)
-                Lz[0, n] = np.kron(Lz[0, n], sigma_z)
-            else:                                       # Off-diagonal element
-                Lx[0, n] = np.kron(Lx[0, n], unit)
-                Ly[0, n] = np.kron(Ly[0, n], unit)
-                Lz[0, n] = np.kron(Lz[0, n], unit)
-
-    Lcol = np.vstack((Lx, Ly, Lz)).real
-    Lrow = Lcol.T  # As opposed to sparse version of code, this works!
-    Lproduct = np.dot(Lrow, Lcol)
-
-    # Hamiltonian operator
-    H = np.zeros((2**nspins, 2**nspins))
-
-    # Add Zeeman interactions:
-    for n in range(nspins):
-        H = H + freqlist[n] * Lz[0, n]
-
-    # Scalar couplings
-
-    # Testing with MATLAB discovered J must be /2.
-    # Believe it is related to the fact that in the SpinDynamics.org simulation
-    # freqs are *2pi, but Js by pi only.
-    scalars = 0.5 * couplings
-    scalars = np.multiply(scalars, Lproduct)
-    for n in range(nspins):
-        for k in range(nspins):
-            H += scalars[n, k].real
-
-    return H
-
-
-def simsignals(H, nspins):
+    def solve(H):
+        if 5 * nev >= H.shape[0]:
+            # LOBPCG is not intended for a large fraction of all eigenpairs
+            return np.linalg.eigh(H.toarray() if issparse(H) else H)
+        X = np.random.RandomState(seed).standard_normal((H.shape[0], nev))
+        E, V = lobpcg(csr_matrix(H), X, largest=largest, tol=tol,
+                      maxiter=maxiter)
+        order = np.argsort(E)
+        return E[order], V[:, order]
+    return solve
+
+
+def simsignals(H, nspins, intensity_cutoff=0.01, dtype=None, refine=True,
+               eigensolver=None):
     """
     Calculates the eigensolution of the spin Hamiltonian H and, using it,
-    returns the allowed transitions as list of (frequency, intensity) tuples.
+    returns the allowed transitions as a Spectrum.
 
     Arguments
     ---------
 
-    H : ndarray
-        the spin Hamiltonian.
+    H : ndarray or sparse matrix
+        the spin Hamiltonian. A sparse H (e.g. from ``bitwise_hamiltonian``)
+        is only converted to a dense array for the default eigensolver.
     nspins : int
         the number of nuclei in the spin system.
+    intensity_cutoff : float
+        transitions with intensities at or below this value are omitted.
+    dtype : numpy dtype or None
+        the precision of the eigensolution; by default, that of `H`. For
+        float32, see ``block_simsignals``.
+    refine : bool
+        with float32, True (default) if the eigenvalues should be refined
+        against `H`. For full float64 accuracy, `H` itself should be
+        float64.
+    eigensolver : callable or None
+        a function of H that returns eigenvalues (ascending) and
+        eigenvectors, e.g. from ``krylov_eigensolver`` or
+        ``lobpcg_eigensolver``. It may return only some eigenpairs, in which
+        case only the transitions between them are returned. By default,
+        all eigenpairs are computed with a dense ``eigh`` (see `dtype`).
+        For large spin systems, use ``block_simsignals``, which applies the
+        eigensolver to each (much smaller) Mz block.
 
     Returns
     -------
-    spectrum : [(float, float)...]
-        a list of (frequency, intensity) tuples.
+    Spectrum
+        the (frequency, intensity) signals.
     """
     # This routine was optimized for speed by vectorizing the intensity
     # calculations, replacing a nested-for signal-by-signal calculation.
-    # Considering that hamiltonian was dramatically faster when refactored to
-    # use arrays instead of sparse matrices, consider an array refactor to this
-    # function as well.
+    # Transitions are also selected with array operations rather than a
+    # nested loop over all 2^(2n-1) state pairs. Intensities are computed
+    # from the structure of the lowering operator (see _sector_signals)
+    # rather than by sparse round trips through the dense eigenvectors.
 
     # The eigensolution calculation apparently must be done on a dense matrix,
     # because eig functions on sparse matrices can't return all answers?!
     # Using eigh so that answers have only real components and no residual small
     # unreal components b/c of rounding errors
-    E, V = np.linalg.eigh(H)    # V will be eigenvectors, v will be frequencies
+    if eigensolver is not None:
+        E, V = eigensolver(H)
+    else:
+        H = H.toarray() if issparse(H) else np.asarray(H)
+        E, V = _eigh(H, H.dtype if dtype is None else dtype, refine)
 
     # Eigh still leaves residual 0j terms, so:
-    V = np.asmatrix(V.real)
-
-    # Calculate signal intensities
-    Vcol = csc_matrix(V)
-    Vrow = csr_matrix(Vcol.T)
-    m = 2 ** nspins
-    T = transition_matrix(m)
-    I = Vrow * T * Vcol
-    I = np.square(I.todense())
-
-    spectrum = []
-    for i in range(m - 1):
-        for j in range(i + 1, m):
-            if I[i, j] > 0.01:  # consider making this minimum intensity
-                                # cutoff a function arg, for flexibility
-                v = abs(E[i] - E[j])
-                spectrum.append((v, I[i, j]))
+    V = np.asarray(V.real)
 
-    return spectrum
+    if nspins >= _SECTOR_MIN_SPINS:
+        sectors = _mz_sectors(V, nspins)
+        if sectors is not None:
+            return _sector_signals(E, V, nspins, sectors, intensity_cutoff)
+
+    # For small systems, or if eigenvectors mix different Mz (possible when
+    # eigenvalues are degenerate), use the full V.T * T * V product.
+    T = transition_matrix(2 ** nspins)
+    if nspins <= _DENSE_TRANSITION_MAX_SPINS:
+        T = T.toarray()
+    I = np.square(V.T.dot(T.dot(V)))
+
+    # Each transition appears twice in the symmetric I; keep the upper
+    # triangle only.
+    i, j = np.nonzero(np.triu(I > intensity_cutoff, 1))
+    return Spectrum.from_columns(np.abs(E[i] - E[j]), I[i, j])
 
 
 # TODO: think about normalize and normalize_ name spacing; will need kwargs
 # to agree across apps.
-def nspinspec(freqs, couplings, normalize=True):
+def nspinspec(freqs, couplings, normalize=True, intensity_cutoff=0.01,
+              cache=None, symmetry=True, window=None, weak_coupling=None,
+              dtype=np.float64, refine=True, spins=None):
     """
     Calculates second-order spectral data (freqency and intensity of signals)
-    for *n* spin-half nuclei.
+    for *n* nuclei (spin-1/2 unless `spins` are given).
 
     Arguments
     ---------
@@ -249,26 +1633,684 @@ def nspinspec(freqs, couplings, normalize=True):
     normalize: bool
         True if the intensities should be normalized so that total intensity
         equals the total number of nuclei.
+    intensity_cutoff : float
+        transitions with (unnormalized) intensities at or below this value
+        are omitted.
+    cache : cache.SpectrumCache or None
+        an optional cache to look up the result in, and to store it in. The
+        spectrum returned is then read-only.
+    symmetry : bool
+        True (default) if groups of magnetically equivalent nuclei should be
+        simulated as composite particles (see ``symmetric_simsignals``).
+    window : (float, float) or None
+        if given, only the signals with frequencies (Hz) in this range are
+        calculated, e.g. to plot only the aromatic region. Normalized
+        intensities are on the same scale as for the full spectrum.
+    weak_coupling : float or None
+        if given, couplings with |J| <= `weak_coupling` * |delta-v| are
+        treated to first order, and only the clusters of strongly coupled
+        nuclei are diagonalized (see ``weak_coupling_simsignals``). Smaller
+        values are more accurate; e.g. 0.05 makes 30+ spin systems practical.
+    dtype : numpy dtype
+        the precision of the eigensolutions: numpy.float64 (default) or
+        numpy.float32, which halves memory use and is faster for display-
+        quality spectra.
+    refine : bool
+        with float32, True (default) if the eigenvalues (frequencies) should
+        be refined to float64 accuracy; see ``_eigh``.
+    spins : [float...] or None
+        the spin quantum number of each nucleus, e.g. [0.5, 0.5, 1] for two
+        protons and a deuteron (2H) or 14N. By default, all nuclei are
+        spin-1/2.
 
     Returns
     -------
-    spectrum : [(float, float)...]
-        a list of (frequency, intensity) tuples.
+    Spectrum
+        the (frequency, intensity) signals.
     """
+    spins = _spin_quantum_numbers(spins, len(freqs))
+    if cache is not None:
+        key = cache.key(freqs, couplings, spins=spins, normalize=normalize,
+                        intensity_cutoff=intensity_cutoff, symmetry=symmetry,
+                        window=window, weak_coupling=weak_coupling,
+                        dtype=np.dtype(dtype).name, refine=refine)
+        spectrum = cache.get(key)
+        if spectrum is not None:
+            return spectrum
+
     nspins = len(freqs)
-    H = hamiltonian(freqs, couplings)
-    spectrum = simsignals(H, nspins)
-    if normalize:
+    if weak_coupling is not None:
+        spectrum = weak_coupling_simsignals(freqs, couplings, weak_coupling,
+                                            intensity_cutoff, symmetry, dtype,
+                                            refine, spins)
+        if window is not None:
+            spectrum = spectrum[(spectrum.frequencies >= window[0])
+                                & (spectrum.frequencies <= window[1])]
+    elif symmetry:
+        spectrum = symmetric_simsignals(freqs, couplings, intensity_cutoff,
+                                        window, dtype, refine, spins)
+    elif spins is not None:
+        spectrum = _spin_block_simsignals(
+            np.asarray(freqs, dtype=float), _symmetrized_couplings(couplings),
+            spins, intensity_cutoff, window, dtype=dtype, refine=refine)
+    else:
+        spectrum = block_simsignals(freqs, couplings, intensity_cutoff,
+                                    window, dtype, refine)
+    if normalize and window is not None:
+        # The total intensity of all allowed transitions, in the window or
+        # not, is the trace of F+F-: n * 2^(n-1) for n spin-1/2 nuclei, and
+        # the sum of 2/3 * S(S+1) * (number of states) over all nuclei in
+        # general.
+        if spins is None:
+            total = nspins * 2 ** (nspins - 1)
+        else:
+            total = (np.prod(2 * spins + 1) * np.sum(spins * (spins + 1))
+                     * 2 / 3)
+        spectrum = Spectrum.from_columns(spectrum.frequencies,
+                                         spectrum.intensities
+                                         * nspins / total)
+    elif normalize:
         spectrum = normalize_spectrum(spectrum, nspins)
+
+    if cache is not None:
+        spectrum = cache.put(key, spectrum)
     return spectrum
 
 
+# Upper limit (in bytes) for the stacks of Hamiltonian blocks that
+# nspinspec_batch diagonalizes at one time.
+_BATCH_MEMORY = 2 ** 26
+
+
+def _block_structure(states, nspins, position):
+    """
+    Computes the parameter-independent parts of an Mz block of the spin
+    Hamiltonian, so that the block can be assembled for any frequencies and
+    couplings as a weighted sum.
+
+    Arguments
+    ---------
+    states : ndarray
+        the spin state numbers in the block.
+    nspins : int
+        the number of spins.
+    position : ndarray
+        maps spin state numbers to their index within their block.
+
+    Returns
+    -------
+    (ndarray, ndarray, ndarray, ndarray, ndarray)
+        Iz values of each spin (len(`states`), n); Iz*Iz products for each
+        spin pair, in ``np.triu_indices(n, 1)`` order (len(`states`),
+        n_pairs); and the row indices, column indices and spin-pair indices
+        of the flip-flop elements.
+    """
+    m, zz, _, _, rows, partners, pairs = _spin_terms(states, nspins)
+    return m, zz, rows, position[partners], pairs
+
+
+def nspinspec_batch(freqs, couplings, normalize=True, intensity_cutoff=0.01):
+    """
+    Calculates second-order spectral data for many spin systems with the
+    same number of spin-half nuclei.
+
+    The Hamiltonians of all spin systems are assembled as 3-D stacks (one
+    per Mz block) and diagonalized together with batched ``eigh`` calls,
+    avoiding the per-call overhead of repeated ``nspinspec`` calls.
+
+    Arguments
+    ---------
+    freqs : array-like
+        an *N, n* array of frequencies in Hz: one row of *n* nuclei
+        frequencies per spin system.
+    couplings : array-like
+        an *N, n, n* array of couplings in Hz: one coupling matrix (see
+        ``nspinspec``) per spin system.
+    normalize: bool
+        True if the intensities should be normalized so that total intensity
+        equals the total number of nuclei.
+    intensity_cutoff : float
+        transitions with (unnormalized) intensities at or below this value
+        are omitted.
+
+    Returns
+    -------
+    [Spectrum...]
+        a list of *N* spectra.
+    """
+    freqs = np.asarray(freqs, dtype=float)
+    J = np.asarray(couplings, dtype=float)
+    J = (J + J.transpose(0, 2, 1)) / 2
+    nsystems, nspins = freqs.shape
+    k, l = np.triu_indices(nspins, 1)
+    Jpairs = J[:, k, l]
+
+    blocks = mz_blocks(nspins)
+    position = _block_positions(blocks, nspins)
+    structures = [_block_structure(states, nspins, position)
+                  for states in blocks]
+    transitions = [
+        _block_transitions(blocks[i], nspins, position, len(blocks[i + 1]))
+        for i in range(nspins)]
+
+    largest = max(len(states) for states in blocks)
+    chunk = max(1, _BATCH_MEMORY // (8 * 3 * largest ** 2))
+
+    peaks = []
+    for start in range(0, nsystems, chunk):
+        stop = min(start + chunk, nsystems)
+        F, Jp = freqs[start:stop], Jpairs[start:stop]
+        eigensolutions = []
+        for states, (m, zz, rows, cols, pairs) in zip(blocks, structures):
+            H = np.zeros((stop - start, len(states), len(states)))
+            diagonal = F.dot(m.T) + Jp.dot(zz.T)
+            H[:, np.arange(len(states)), np.arange(len(states))] = diagonal
+            H[:, rows, cols] = 0.5 * Jp[:, pairs]
+            eigensolutions.append(np.linalg.eigh(H))
+        peaks.extend(_batch_signals(eigensolutions, transitions,
+                                    intensity_cutoff))
+    return _batch_spectra(peaks, nspins, normalize)
+
+
+def _batch_signals(eigensolutions, transitions, intensity_cutoff):
+    """
+    Computes the signals of a stack of spin systems from the batched
+    eigensolutions of their Mz blocks.
+
+    Arguments
+    ---------
+    eigensolutions : [(ndarray, ndarray)...]
+        the stacked eigenvalues and eigenvectors of each Mz block.
+    transitions : [ndarray...]
+        the <j|F-|i> elements from each Mz block to the next.
+    intensity_cutoff : float
+        transitions with intensities at or below this value are omitted.
+
+    Returns
+    -------
+    [[ndarray...]...]
+        for each spin system, the (frequency, intensity) arrays of its
+        signals, one per pair of blocks.
+    """
+    nsystems = len(eigensolutions[0][0])
+    peaks = [[] for _ in range(nsystems)]
+    for i, T in enumerate(transitions):
+        E1, V1 = eigensolutions[i]
+        E2, V2 = eigensolutions[i + 1]
+        I = np.square(np.matmul(np.matmul(V1.transpose(0, 2, 1), T), V2))
+        system, a, b = np.nonzero(I > intensity_cutoff)
+        v = np.abs(E1[system, a] - E2[system, b])
+        lines = np.column_stack((v, I[system, a, b]))
+        bounds = np.searchsorted(system, np.arange(nsystems + 1))
+        for s in range(nsystems):
+            peaks[s].append(lines[bounds[s]:bounds[s + 1]])
+    return peaks
+
+
+def _batch_spectra(peaks, nspins, normalize):
+    """
+    Assembles (and optionally normalizes) the spectra of ``_batch_signals``.
+    """
+    spectra = [Spectrum(np.concatenate(p)) for p in peaks]
+    if normalize:
+        for spectrum in spectra:
+            spectrum.intensities[:] *= nspins / spectrum.intensities.sum()
+    return spectra
+
+
+def field_sweep(shifts, couplings, fields, normalize=True,
+                intensity_cutoff=0.01):
+    """
+    Calculates the second-order spectra of one spin system of spin-half
+    nuclei at several spectrometer frequencies.
+
+    Only the Zeeman terms of the Hamiltonian depend on the field (the
+    frequencies are chemical shift * spectrometer frequency), so the
+    coupling part of each Mz block is assembled once. The scaled Zeeman
+    diagonals are then added for all fields at once, and the blocks of all
+    fields are diagonalized with batched ``eigh`` calls.
+
+    Arguments
+    ---------
+    shifts : [float...]
+        a list of *n* chemical shifts in ppm.
+    couplings : array-like
+        an *n, n* array of couplings in Hz (see ``nspinspec``).
+    fields : [float...]
+        the spectrometer frequencies in MHz, e.g. [60, 300, 400, 600, 900].
+    normalize: bool
+        True if the intensities should be normalized so that total intensity
+        equals the total number of nuclei.
+    intensity_cutoff : float
+        transitions with (unnormalized) intensities at or below this value
+        are omitted.
+
+    Returns
+    -------
+    [Spectrum...]
+        one spectrum (frequencies in Hz) per field, in the order of
+        `fields`.
+    """
+    shifts = np.asarray(shifts, dtype=float)
+    fields = np.asarray(fields, dtype=float)
+    J = _symmetrized_couplings(couplings)
+    nspins = len(shifts)
+    k, l = np.triu_indices(nspins, 1)
+    Jpairs = J[k, l]
+
+    blocks = mz_blocks(nspins)
+    position = _block_positions(blocks, nspins)
+    coupling_parts, zeeman_parts = [], []
+    for states in blocks:
+        m, zz, rows, cols, pairs = _block_structure(states, nspins, position)
+        HJ = np.diag(zz.dot(Jpairs))
+        HJ[rows, cols] = 0.5 * Jpairs[pairs]
+        coupling_parts.append(HJ)
+        zeeman_parts.append(m.dot(shifts))
+    transitions = [
+        _block_transitions(blocks[i], nspins, position, len(blocks[i + 1]))
+        for i in range(nspins)]
+
+    largest = max(len(states) for states in blocks)
+    chunk = max(1, _BATCH_MEMORY // (8 * 3 * largest ** 2))
+
+    peaks = []
+    for start in range(0, len(fields), chunk):
+        B = fields[start:start + chunk]
+        eigensolutions = []
+        for HJ, zeeman in zip(coupling_parts, zeeman_parts):
+            H = np.repeat(HJ[np.newaxis], len(B), axis=0)
+            diagonal = np.arange(len(HJ))
+            H[:, diagonal, diagonal] += np.outer(B, zeeman)
+            eigensolutions.append(np.linalg.eigh(H))
+        peaks.extend(_batch_signals(eigensolutions, transitions,
+                                    intensity_cutoff))
+    return _batch_spectra(peaks, nspins, normalize)
+
+
+# Blocks up to this size are always re-solved with a full eigh, which is as
+# cheap as a perturbative update for them.
+_UPDATE_MIN_BLOCK = 64
+
+
+class SpinSystem:
+    """
+    A system of *n* spin-1/2 nuclei whose spectrum is recalculated as its
+    parameters change one at a time (e.g. in an interactive fitting UI).
+
+    The eigensolution of every Mz block is kept between changes. When a
+    frequency or coupling changes, each block's eigensolution is updated in
+    one of three ways, from cheapest to most expensive:
+
+    1. The old eigenvectors are kept and the eigenvalues are shifted by the
+       expectation value of the change (first-order energies). Costs
+       O(N^2) per block.
+    2. The eigenvectors are corrected to first order in the change (after
+       diagonalizing any groups of nearly degenerate states that the change
+       mixes strongly), and the eigenvalues are recomputed as Rayleigh
+       quotients. Costs two dense matrix products per block.
+    3. The block is diagonalized from scratch (``numpy.linalg.eigh``).
+
+    An update is accepted only if the residual norm |H*v - E*v| of every
+    eigenvector (an upper bound on the error of its eigenvalue, in Hz) stays
+    below `tolerance`; otherwise the next method is tried.
+
+    Arguments
+    ---------
+    freqs : [float...]
+        a list of *n* nuclei frequencies in Hz.
+    couplings : array-like
+        an *n, n* array of couplings in Hz.
+    intensity_cutoff : float
+        transitions with (unnormalized) intensities at or below this value
+        are omitted.
+    tolerance : float
+        the largest eigenvector residual norm (Hz) accepted from an update.
+    """
+
+    def __init__(self, freqs, couplings, intensity_cutoff=0.01,
+                 tolerance=1e-2):
+        self.freqs = np.array(freqs, dtype=float)
+        self.couplings = _symmetrized_couplings(couplings)
+        self.intensity_cutoff = intensity_cutoff
+        self.tolerance = tolerance
+        self.nspins = len(self.freqs)
+        self.full_solves = 0
+        self._blocks = mz_blocks(self.nspins)
+        self._position = _block_positions(self._blocks, self.nspins)
+        self._eigensolutions = [self._solve(states) for states in self._blocks]
+        self._residuals = np.zeros(len(self._blocks))
+
+    def _block(self, freqs, couplings, states):
+        return _block_hamiltonian(freqs, couplings, states, self.nspins,
+                                  self._position)
+
+    def _solve(self, states):
+        self.full_solves += 1
+        return np.linalg.eigh(self._block(self.freqs, self.couplings, states))
+
+    def set_frequency(self, i, v):
+        """
+        Changes the frequency (Hz) of nucleus `i` to `v`.
+        """
+        dfreqs = np.zeros(self.nspins)
+        dfreqs[i] = v - self.freqs[i]
+        self.freqs[i] = v
+        self._update(dfreqs, np.zeros((self.nspins, self.nspins)))
+
+    def set_coupling(self, i, j, J):
+        """
+        Changes the coupling (Hz) between nuclei `i` and `j` to `J`.
+        """
+        dJ = np.zeros((self.nspins, self.nspins))
+        dJ[i, j] = dJ[j, i] = J - self.couplings[i, j]
+        self.couplings[i, j] = self.couplings[j, i] = J
+        self._update(np.zeros(self.nspins), dJ)
+
+    def _update(self, dfreqs, dJ):
+        for k, states in enumerate(self._blocks):
+            E, V = self._eigensolutions[k]
+            if len(states) < _UPDATE_MIN_BLOCK:
+                self._eigensolutions[k] = self._solve(states)
+                self._residuals[k] = 0
+                continue
+            # The Hamiltonian is linear in the parameters, so the change of
+            # the block is the block Hamiltonian of the parameter changes.
+            dH = csr_matrix(self._block(dfreqs, dJ, states))
+            dHV = np.asarray(dH.dot(V))
+
+            # 1. first-order energies, old eigenvectors
+            dE = np.einsum('ij,ij->j', V, dHV)
+            residual = self._residuals[k] + np.linalg.norm(
+                dHV - V * dE, axis=0).max()
+            if residual <= self.tolerance:
+                E = E + dE
+                order = np.argsort(E)
+                self._eigensolutions[k] = (E[order], V[:, order])
+                self._residuals[k] = residual
+                continue
+
+            # 2. first-order eigenvectors, Rayleigh quotient energies. Groups
+            # of (nearly) degenerate states that the change mixes strongly
+            # are first diagonalized among themselves.
+            M = V.T.dot(dHV)
+            D = E + np.diag(M)
+            np.fill_diagonal(M, 0)
+            gaps = D - D[:, np.newaxis]
+            _, labels = connected_components(
+                csr_matrix(np.abs(M) > 0.1 * np.abs(gaps)), directed=False)
+            rotations = []
+            for label in np.flatnonzero(np.bincount(labels) > 1):
+                group = np.flatnonzero(labels == label)
+                D[group], u = np.linalg.eigh(M[np.ix_(group, group)]
+                                             + np.diag(D[group]))
+                M[:, group] = M[:, group].dot(u)
+                M[group, :] = u.T.dot(M[group, :])
+                rotations.append((group, u))
+            gaps = D - D[:, np.newaxis]
+            same = labels[:, np.newaxis] == labels
+            # U * (I + C), where U rotates the groups and C is the
+            # first-order correction between groups
+            UC = np.where(same, 0, M / np.where(same | (gaps == 0), 1, gaps))
+            UC[np.diag_indices_from(UC)] = 1
+            for group, u in rotations:
+                UC[group, :] = u.dot(UC[group, :])
+            W = V.dot(UC)
+            HW = np.asarray(csr_matrix(
+                self._block(self.freqs, self.couplings, states)).dot(W))
+            norms = np.linalg.norm(W, axis=0)
+            W /= norms
+            HW /= norms
+            E = np.einsum('ij,ij->j', W, HW)
+            residual = np.linalg.norm(HW - W * E, axis=0).max()
+            if residual <= self.tolerance:
+                order = np.argsort(E)
+                self._eigensolutions[k] = (E[order], W[:, order])
+                self._residuals[k] = residual
+                continue
+
+            # 3. full solution
+            self._eigensolutions[k] = self._solve(states)
+            self._residuals[k] = 0
+
+    def spectrum(self, normalize=True):
+        """
+        Computes the spectrum for the current parameters.
+
+        Arguments
+        ---------
+        normalize: bool
+            True if the intensities should be normalized so that total
+            intensity equals the total number of nuclei.
+
+        Returns
+        -------
+        Spectrum
+            the (frequency, intensity) signals.
+        """
+        spectrum = _eigen_block_signals(
+            self._eigensolutions,
+            lambda k: _block_transitions(self._blocks[k], self.nspins,
+                                         self._position,
+                                         len(self._blocks[k + 1])),
+            self.intensity_cutoff)
+        if normalize:
+            spectrum = normalize_spectrum(spectrum, self.nspins)
+        return spectrum
+
+
+##############################################################################
+# Time-domain (FID) simulation
+##############################################################################
+
+# Up to this many spins, simfid computes the exact trace over all basis
+# states by default; above it, a random-phase estimate.
+_FID_EXACT_MAX_SPINS = 8
+
+
+def _chebyshev_propagator(H, dt, tolerance=1e-12):
+    """
+    Prepares the propagator exp(-2*pi*i*H*dt) of a sparse Hamiltonian (Hz)
+    as a Chebyshev expansion, which needs only sparse matrix products.
+
+    The spectrum of H is bounded by the Gershgorin discs and mapped onto
+    [-1, 1]; the expansion coefficients are Bessel functions, truncated
+    where they fall below `tolerance`.
+
+    Returns
+    -------
+    callable
+        a function that applies the propagator to a (vector or array of)
+        state vector(s).
+    """
+    H = csr_matrix(H)
+    diagonal = H.diagonal()
+    radius = np.asarray(abs(H).sum(axis=1)).ravel() - np.abs(diagonal)
+    low, high = (diagonal - radius).min(), (diagonal + radius).max()
+    center = (high + low) / 2
+    half = max((high - low) / 2, 1e-12)
+    Hs = csr_matrix((H - center * identity(H.shape[0], format='csr')) / half)
+    theta = 2 * np.pi * half * dt
+    orders = np.arange(int(1.5 * theta) + 30)
+    bessel = jv(orders, theta)
+    order = np.flatnonzero(np.abs(bessel) > tolerance).max() + 1
+    coefficients = 2 * (-1j) ** orders[:order] * bessel[:order]
+    coefficients[0] /= 2
+    phase = np.exp(-2j * np.pi * center * dt)
+
+    def product(v):
+        # the real matrix times the interleaved real and imaginary parts,
+        # which avoids a complex copy of the matrix for every product
+        return Hs.dot(v.view(float)).view(complex)
+
+    def propagate(v):
+        previous = np.ascontiguousarray(v, dtype=complex)
+        current = product(previous)
+        result = coefficients[0] * previous + coefficients[1] * current
+        for c in coefficients[2:]:
+            following = product(current)
+            following *= 2
+            following -= previous
+            previous, current = current, following
+            result += c * current
+        result *= phase
+        return result
+    return propagate
+
+
+def simfid(H, nspins, dwell, points, carrier=0.0, nvectors=None, seed=0):
+    """
+    Simulates the free induction decay (FID) of *n* spin-1/2 nuclei after a
+    90 degree pulse by propagating state vectors in time, without
+    diagonalizing H.
+
+    The FID is Tr[F+ exp(-iHt) F- exp(iHt)], computed from the terms
+    <r| exp(iHt) F+ exp(-iHt) F- |r> for state vectors |r>: all basis
+    states (exact), or `nvectors` random-phase vectors (an unbiased
+    estimate, with a relative error of the order of
+    1/sqrt(`nvectors` * 2^n)). Each time step is a Chebyshev expansion of
+    sparse products with H (see ``_chebyshev_propagator``), so with random
+    vectors memory use is proportional to the number of nonzero elements
+    of H, not to 4^n.
+
+    Arguments
+    ---------
+    H : ndarray or sparse matrix
+        the spin Hamiltonian in Hz, e.g. ``bitwise_hamiltonian(...,
+        sparse=True)``.
+    nspins : int
+        the number of nuclei in the spin system.
+    dwell : float
+        the time (s) between points; 1 / spectral width.
+    points : int
+        the number of points.
+    carrier : float
+        the reference frequency (Hz): signals appear at their frequency
+        minus `carrier`, so that only the spectral width around `carrier`
+        needs to be sampled.
+    nvectors : int or None
+        the number of random state vectors; by default, the exact trace up
+        to ``_FID_EXACT_MAX_SPINS`` spins and 32 random vectors above.
+    seed : int
+        the seed for the random state vectors.
+
+    Returns
+    -------
+    ndarray
+        the complex FID, normalized so that FID(0) = `nspins` (the total
+        intensity of a normalized spectrum).
+    """
+    size = 2 ** nspins
+    states = np.arange(size)
+    Fz = (0.5 - _spin_bits(states, nspins)).sum(axis=1)
+    H = csr_matrix(H) - carrier * csr_matrix((Fz, (states, states)),
+                                             shape=(size, size))
+    # F- lowers one spin, i.e. sets one bit: from state i to a state j > i
+    Fminus = tril(transition_matrix(size), -1, format='csr')
+    Fplus = Fminus.T.tocsr()
+
+    if nvectors is None and nspins <= _FID_EXACT_MAX_SPINS:
+        R = np.eye(size, dtype=complex)
+        scale = 1 / 2 ** (nspins - 1)
+    else:
+        phases = np.random.RandomState(seed).uniform(
+            0, 2 * np.pi, (size, nvectors or 32))
+        R = np.exp(1j * phases)
+        # E[<r|A|r>] = Tr(A) for random-phase vectors
+        scale = 1 / (R.shape[1] * 2 ** (nspins - 1))
+    count = R.shape[1]
+    vectors = np.hstack((Fminus.dot(R), R))
+
+    propagate = _chebyshev_propagator(H, dwell)
+    fid = np.empty(points, dtype=complex)
+    for k in range(points):
+        a, b = vectors[:, :count], vectors[:, count:]
+        fid[k] = np.vdot(b, Fplus.dot(a))
+        vectors = propagate(vectors)
+    return fid * scale
+
+
+def fid_lineshape(fid, dwell, carrier=0.0, linewidth=0.5):
+    """
+    Converts an FID to a lineshape by exponential line broadening and a
+    Fourier transform (``numpy.fft``).
+
+    The lineshape is on the same scale as ``nmrplot.add_signals`` for the
+    (normalized) signals with the same `linewidth`.
+
+    Arguments
+    ---------
+    fid : ndarray
+        the complex FID (see ``simfid``).
+    dwell : float
+        the time (s) between points.
+    carrier : float
+        the reference frequency (Hz) of the FID.
+    linewidth : float
+        the width (Hz) at half height of the Lorentzian lines.
+
+    Returns
+    -------
+    (ndarray, ndarray)
+        the frequencies (Hz, ascending) and intensities.
+    """
+    t = dwell * np.arange(len(fid))
+    signal = fid * np.exp(-np.pi * linewidth * t)
+    signal[0] /= 2  # the trapezoid rule for the Fourier integral from t = 0
+    y = np.fft.fftshift(np.fft.fft(signal)).real * dwell * np.pi / 2
+    x = np.fft.fftshift(np.fft.fftfreq(len(fid), dwell)) + carrier
+    return x, y
+
+
+def nspinfid(freqs, couplings, points=8192, spectral_width=None,
+             linewidth=0.5, nvectors=None, seed=0):
+    """
+    Calculates the lineshape of *n* spin-half nuclei in the time domain: an
+    alternative to ``nspinspec`` (plus ``nmrplot.add_signals``) for systems
+    too large to diagonalize.
+
+    Arguments
+    ---------
+    freqs : [float...]
+        a list of *n* nuclei frequencies in Hz.
+    couplings : array-like
+        an *n, n* array of couplings in Hz.
+    points : int
+        the number of FID points, and of points in the lineshape.
+    spectral_width : float or None
+        the width (Hz) of the spectrum, centered on the frequencies. By
+        default, the frequency range plus twice the sum of the couplings and
+        20 linewidths.
+    linewidth : float
+        the width (Hz) at half height of the Lorentzian lines.
+    nvectors : int or None
+        the number of random state vectors (see ``simfid``).
+    seed : int
+        the seed for the random state vectors.
+
+    Returns
+    -------
+    (ndarray, ndarray)
+        the frequencies (Hz, ascending) and intensities.
+    """
+    freqs = np.asarray(freqs, dtype=float)
+    J = _symmetrized_couplings(couplings)
+    if spectral_width is None:
+        spectral_width = (np.ptp(freqs) + np.abs(J).sum()
+                          + 20 * linewidth)
+    carrier = (freqs.max() + freqs.min()) / 2
+    dwell = 1 / spectral_width
+    fid = simfid(bitwise_hamiltonian(freqs, J, sparse=True), len(freqs),
+                 dwell, points, carrier, nvectors, seed)
+    return fid_lineshape(fid, dwell, carrier, linewidth)
+
+
 ##############################################################################
 # First-order simulation
 ##############################################################################
 
-# doublet, multiplet, add_peaks, and reduce_peaks are used to generate
-# first-order splitting patterns
+# doublet, multiplet, add_peaks, and reduce_peaks (merge_peaks) are used to
+# generate first-order splitting patterns
 
 def doublet(plist, J):
     """
@@ -277,21 +2319,23 @@ def doublet(plist, J):
 
     Arguments
     ---------
-    plist : [(float, float)...]
-        a list of (frequency{Hz}, intensity) tuples.
-    J : float
-        The coupling constant in Hz.
+    plist : Spectrum or [(float, float)...]
+        the (frequency{Hz}, intensity) signals.
+    J : float or array-like
+        The coupling constant in Hz, or one coupling constant per signal.
 
     Returns
     -------
-    [(float, float)...]
-        a list of (frequency, intensity) tuples.
+    Spectrum
+        the (frequency, intensity) signals.
     """
-    res = []
-    for v, i in plist:
-        res.append((v - J / 2, i / 2))
-        res.append((v + J / 2, i / 2))
-    return res
+    peaks = Spectrum(plist).peaks
+    res = np.repeat(peaks, 2, axis=0)
+    J = np.asarray(J, dtype=float)
+    res[0::2, 0] -= J / 2
+    res[1::2, 0] += J / 2
+    res[:, 1] /= 2
+    return Spectrum(res)
 
 
 def multiplet(signal, couplings):
@@ -310,18 +2354,257 @@ def multiplet(signal, couplings):
 
     Returns
     -------
-    [(float, float)...]
-        a plist of the multiplet that results from splitting the plist
-        signal(s) by each J.
+    Spectrum
+        the multiplet that results from splitting the signal by each J.
 
     """
-    res = [signal]
+    res = Spectrum([signal])
     for coupling in couplings:
         for i in range(coupling[1]):
             res = doublet(res, coupling[0])
     return res
 
 
+def _combine_lines(groups, frequencies, intensities, tolerance):
+    """
+    Sorts lines by group and frequency, and combines runs of lines of the
+    same group whose neighbors are within `tolerance` (Hz) into one line,
+    at their intensity-weighted average frequency.
+
+    Returns
+    -------
+    (ndarray, ndarray, ndarray)
+        the groups, frequencies (ascending within each group) and
+        intensities of the combined lines.
+    """
+    order = np.lexsort((frequencies, groups))
+    groups = groups[order]
+    frequencies, intensities = frequencies[order], intensities[order]
+    starts = np.flatnonzero(np.concatenate(
+        ([True], (np.diff(frequencies) > tolerance) | (np.diff(groups) != 0))))
+    totals = np.add.reduceat(intensities, starts)
+    weighted = np.add.reduceat(frequencies * intensities, starts)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        averages = np.where(totals != 0, weighted / totals,
+                            frequencies[starts])
+    return groups[starts], averages, totals
+
+
+def _prune_lines(groups, offsets, intensities, resolution, intensity_floor):
+    """
+    Combines the lines of each group (sorted by group, then offset from the
+    group's center) into runs narrower than `resolution`, each at its
+    intensity-weighted average offset, and then drops lines weaker than
+    `intensity_floor` times the strongest line of their group.
+
+    Runs are formed outward from the center, so that a symmetric multiplet
+    stays symmetric: the lines less than `resolution` / 2 from the center
+    form one run, and on either side a run takes every following line less
+    than `resolution` further out than its first line. Lines closer than
+    `resolution` are therefore combined unless a run boundary falls between
+    them, and no line moves by `resolution` or more.
+
+    Arguments
+    ---------
+    resolution : float or ndarray
+        the run width (Hz), for all lines or per line; lines with a
+        resolution of 0 are not combined.
+
+    Returns
+    -------
+    (ndarray, ndarray, ndarray)
+        the groups, offsets and intensities of the remaining lines, sorted by
+        group, then offset.
+    """
+    resolution = np.broadcast_to(np.asarray(resolution, dtype=float),
+                                 groups.shape)
+    if resolution.any():
+        # Sort the lines of each side (-1, 0 or 1) of each group by their
+        # distance from the center, and spread the sides apart on one axis,
+        # so that one searchsorted finds, for every line, the first line of
+        # its side that is `resolution` or more further out (or the next
+        # side's first line).
+        side = np.where(np.abs(offsets) < resolution / 2, 0,
+                        np.sign(offsets)).astype(int)
+        distance = np.abs(offsets)
+        order = np.lexsort((distance, side, groups))
+        groups, offsets, intensities, resolution, side, distance = (
+            groups[order], offsets[order], intensities[order],
+            resolution[order], side[order], distance[order])
+        new_side = np.concatenate(
+            ([True], (np.diff(groups) != 0) | (np.diff(side) != 0)))
+        ranks = np.cumsum(new_side) - 1
+        width = distance.max() + 2 * resolution.max() + 1
+        keys = distance + ranks * width
+        following = np.maximum(np.searchsorted(keys, keys + resolution),
+                               np.arange(1, len(keys) + 1))
+        # the center lines of a group are all one run
+        side_starts = np.flatnonzero(new_side)
+        side_ends = np.append(side_starts[1:], len(keys))
+        center = side == 0
+        following[center] = side_ends[ranks[center]]
+        # follow the chains of run starts of all sides at once; a chain ends
+        # at the (already marked) first line of the next side
+        run_start = np.zeros(len(groups), dtype=bool)
+        starts = side_starts
+        while len(starts):
+            run_start[starts] = True
+            starts = following[starts]
+            starts = starts[starts < len(groups)]
+            starts = starts[~run_start[starts]]
+        runs = np.cumsum(run_start) - 1
+        _, offsets, intensities = _combine_lines(
+            runs, offsets, intensities, np.inf)
+        groups = groups[run_start]
+        order = np.lexsort((offsets, groups))
+        groups, offsets, intensities = (
+            groups[order], offsets[order], intensities[order])
+    if intensity_floor:
+        starts = np.flatnonzero(np.concatenate(
+            ([True], np.diff(groups) != 0)))
+        strongest = np.maximum.reduceat(np.abs(intensities), starts)
+        sizes = np.diff(np.append(starts, len(groups)))
+        keep = np.abs(intensities) >= (intensity_floor
+                                       * np.repeat(strongest, sizes))
+        groups, offsets, intensities = (
+            groups[keep], offsets[keep], intensities[keep])
+    return groups, offsets, intensities
+
+
+def first_order_spectrum(signals, couplings, indptr, tolerance=1e-9,
+                         resolution=None, intensity_floor=0):
+    """
+    Splits many signals (e.g. all signals of a molecule) into first-order
+    multiplets at once.
+
+    The couplings of all signals are given as one ragged table in the
+    compressed sparse row (CSR) layout: the couplings of signal *i* are rows
+    ``indptr[i]`` to ``indptr[i + 1]`` of `couplings`. The splittings are
+    applied in rounds: round *r* applies the *r*-th coupling of every signal
+    that has one, to all of that signal's lines at once (see
+    ``binomial_multiplet``), so the number of Python-level steps is the
+    largest number of couplings of any signal, not the number of signals.
+
+    Many small (e.g. long-range) couplings multiply the number of lines far
+    beyond what can be resolved. With a `resolution`, close lines of each
+    signal are combined after each of its *k* couplings is applied, in runs
+    less than `resolution` / 2*k wide (and after the last coupling, another
+    `resolution` / 2 wider), so that no line moves by `resolution` or more
+    in all, and symmetric multiplets stay symmetric (see ``_prune_lines``).
+    With an `intensity_floor`, lines weaker than that fraction of the
+    strongest line of their signal are then dropped (their intensity is
+    lost). Either bounds the number of lines per signal.
+
+    Arguments
+    ---------
+    signals : array-like
+        an *N, 2* array of (frequency, intensity) signals.
+    couplings : array-like
+        an *M, 2* array of (J, # of nuclei) couplings.
+    indptr : array-like
+        *N* + 1 ascending row offsets into `couplings`, starting at 0.
+    tolerance : float
+        lines of the same signal closer than this (Hz) are combined.
+    resolution : float or None
+        if given, the largest distance (Hz), not included, by which a line
+        may move when close lines are combined.
+    intensity_floor : float
+        the smallest intensity kept, relative to the strongest line of the
+        same signal (e.g. 1e-3); 0 keeps all lines.
+
+    Returns
+    -------
+    Spectrum
+        the (frequency, intensity) lines of all multiplets, in the order of
+        `signals` and by frequency within each multiplet.
+
+    Example
+    -------
+    n-propanol (see ``first_order``)::
+
+        signals = [(1200, 2), (450, 2), (300, 3)]
+        couplings = [(7, 2), (7, 2), (7, 3), (7, 2)]
+        indptr = [0, 1, 3, 4]
+    """
+    signals = np.asarray(signals, dtype=float).reshape(-1, 2)
+    couplings = np.asarray(couplings, dtype=float).reshape(-1, 2)
+    indptr = np.asarray(indptr, dtype=int)
+    counts = np.diff(indptr)
+
+    owners = np.arange(len(signals))
+    offsets = np.zeros(len(signals))
+    intensities = signals[:, 1].copy()
+    for r in range(counts.max(initial=0)):
+        # the r-th coupling of the signal of each line (J = n = 0 if none)
+        rows = np.flatnonzero(counts[owners] > r)
+        J = np.zeros(len(owners))
+        n = np.zeros(len(owners), dtype=int)
+        J[rows] = couplings[indptr[owners[rows]] + r, 0]
+        n[rows] = couplings[indptr[owners[rows]] + r, 1]
+        # line i becomes n[i] + 1 lines, k = 0...n[i]
+        sizes = n + 1
+        lines = np.repeat(np.arange(len(owners)), sizes)
+        k = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+        n = n[lines]
+        offsets = offsets[lines] + (k - n / 2) * J[lines]
+        intensities = intensities[lines] * binom(n, k) / 2.0 ** n
+        owners, offsets, intensities = _combine_lines(
+            owners[lines], offsets, intensities, tolerance)
+        if resolution or intensity_floor:
+            # each of the k couplings of a signal may move its lines by less
+            # than resolution / 2k, and the last by another resolution / 2,
+            # so that they move by less than `resolution` in all
+            step = np.zeros(len(owners))
+            if resolution:
+                k = counts[owners]
+                step[k > r] = resolution / (2 * k[k > r])
+                step[k == r + 1] += resolution / 2
+            owners, offsets, intensities = _prune_lines(
+                owners, offsets, intensities, step, intensity_floor)
+    return Spectrum.from_columns(signals[owners, 0] + offsets, intensities)
+
+
+def binomial_multiplet(signal, couplings, tolerance=1e-9, resolution=None,
+                       intensity_floor=0):
+    """
+    Splits a signal into a first-order multiplet, with coincident lines
+    combined.
+
+    Each (J, n) splitting is a set of n + 1 lines, (k - n/2) * J from the
+    center with binomial intensities. The splittings are combined one at a
+    time by discrete convolution (every line of the multiplet so far with
+    every line of the next splitting), and coincident lines are combined
+    after each step. The work and the size of the result are therefore
+    bounded by the number of distinct lines, e.g. 7 * 2 * 3 = 42 for a
+    septet of doublets of triplets, rather than the 2^k signals of ``k``
+    successive ``doublet`` splittings (2^9 = 512 for the same pattern).
+
+    Arguments
+    ---------
+    signal : (float, float)
+        a (frequency, intensity) tuple.
+    couplings : [(float, int)...]
+        a list of (J, # of nuclei) tuples.
+    tolerance : float
+        lines closer than this (Hz) are combined.
+    resolution : float or None
+        if given, close lines are combined as the multiplet is built, moving
+        each line by less than this (Hz) (see ``first_order_spectrum``).
+    intensity_floor : float
+        lines weaker than this fraction of the strongest line are dropped
+        after each splitting.
+
+    Returns
+    -------
+    Spectrum
+        the (frequency, intensity) signals, sorted by frequency.
+    """
+    couplings = list(couplings)
+    return first_order_spectrum([signal], couplings or np.empty((0, 2)),
+                                [0, len(couplings)], tolerance, resolution,
+                                intensity_floor)
+
+
 def add_peaks(plist):
     """
     Reduces a list of (frequency, intensity) tuples to an
@@ -329,8 +2612,8 @@ def add_peaks(plist):
 
     Argument
     --------
-    plist: [(float, float)...]
-        a list of (frequency, intensity) tuples
+    plist: Spectrum or [(float, float)...]
+        the (frequency, intensity) signals.
 
     Returns
     -------
@@ -348,6 +2631,85 @@ def add_peaks(plist):
     return v_total / len(plist), i_total
 
 
+def merge_peaks(peaks, tolerance=0, spectrometer_frequency=None):
+    """
+    Sorts (frequency, intensity) peaks and combines peaks whose frequencies
+    are within a tolerance of their neighbors.
+
+    Runs of peaks where each peak is within `tolerance` of the previous one
+    are combined into a single peak, with the total intensity of the run at
+    its intensity-weighted average frequency. The peaks are handled as
+    arrays (one sort and one ``numpy.add.reduceat``), so large peak lists
+    (e.g. from ``nspinspec``) are merged in O(n log n).
+
+    Arguments
+    ---------
+    peaks : Spectrum, ndarray or iterable of (float, float)
+        the (frequency, intensity) peaks, in any order.
+    tolerance : float
+        the largest frequency difference between neighboring peaks that are
+        combined; in Hz, or in ppm if `spectrometer_frequency` is given.
+    spectrometer_frequency : float or None
+        the spectrometer frequency in MHz, for a tolerance in ppm.
+
+    Returns
+    -------
+    Spectrum
+        the merged peaks, sorted by frequency.
+    """
+    peaks = Spectrum(peaks).peaks
+    if not len(peaks):
+        return Spectrum()
+    if spectrometer_frequency is not None:
+        tolerance = tolerance * spectrometer_frequency
+    _, frequencies, intensities = _combine_lines(
+        np.zeros(len(peaks), dtype=int), peaks[:, 0], peaks[:, 1], tolerance)
+    return Spectrum.from_columns(frequencies, intensities)
+
+
+def merge_sorted_peaks(spectra, tolerance=0):
+    """
+    Lazily merges many spectra that are each sorted by frequency into one
+    sorted stream of peaks, combining coincident peaks on the fly.
+
+    The spectra are merged with ``heapq.merge``. Spectrum inputs are iterated
+    a chunk of rows at a time, so only a small buffer of pending peaks per
+    spectrum and the current run of close peaks are held as Python objects
+    (lists of tuples are, of course, already held in full).
+    Peaks are combined as by ``merge_peaks``: each run of peaks within
+    `tolerance` of the previous one becomes one peak, with the total
+    intensity at the intensity-weighted average frequency.
+
+    Arguments
+    ---------
+    spectra : iterable of Spectrum or [(float, float)...]
+        the spectra (or any iterables of (frequency, intensity) pairs), each
+        sorted by frequency.
+    tolerance : float
+        the largest frequency difference (Hz) between neighboring peaks that
+        are combined.
+
+    Yields
+    ------
+    (float, float)
+        the merged (frequency, intensity) peaks, in ascending frequency.
+    """
+    run_start = last = None
+    total = weighted = 0.0
+    for v, i in heapq.merge(*spectra, key=itemgetter(0)):
+        if last is not None and v - last > tolerance:
+            yield (weighted / total if total else run_start), total
+            run_start = None
+        if run_start is None:
+            run_start = v
+            total = weighted = 0.0
+        total += i
+        weighted += v * i
+        last = v
+    if run_start is not None:
+        yield (weighted / total if total else run_start), total
+
+
 def reduce_peaks(plist, tolerance=0):
     """
     Takes an ordered list of (x, y) tuples and adds together tuples whose first
@@ -355,32 +2717,18 @@ def reduce_peaks(plist, tolerance=0):
 
     Arguments
     ---------
-    plist : [(float, float)...]
+    plist : Spectrum or [(float, float)...]
         A *sorted* list of (x, y) tuples (sorted by x)
     tolerance : float
-        tuples that differ in x by <= tolerance are combined using ``add_peaks``
+        tuples that differ in x by <= tolerance are combined, at their
+        intensity-weighted average x (see ``merge_peaks``)
 
     Returns
     -------
-    [(float, float)...]
-        a list of (x, y) tuples where all x values differ by > `tolerance`
-    """
-    res = []
-    work = [plist[0]]  # an accumulator of peaks to be processed
-    for i in range(1, len(plist)):
-        if not work:
-            work.append(plist)
-            continue
-        if plist[i][0] - work[-1][0] <= tolerance:
-            work.append(plist[i])  # accumulate close peaks
-            continue
-        else:
-            res.append(add_peaks(work))
-            work = [plist[i]]
-    if work:
-        res.append(add_peaks(work))
-
-    return res
+    Spectrum
+        the (x, y) signals, where all x values differ by > `tolerance`
+    """
+    return merge_peaks(plist, tolerance)
 
 
 def _normalize(intensities, n=1):
@@ -400,7 +2748,8 @@ def _normalize(intensities, n=1):
         intensities[index] = intensity * factor
 
 
-def first_order(signal, couplings):  # Wa, RightHz, WdthHz not implemented yet
+def first_order(signal, couplings, resolution=None, intensity_floor=0):
+    # Wa, RightHz, WdthHz not implemented yet
     """
     Splits a signal into a first-order multiplet.
 
@@ -410,13 +2759,20 @@ def first_order(signal, couplings):  # Wa, RightHz, WdthHz not implemented yet
         a (frequency, intensity) tuple.
     couplings : [(float, int)...]
         a list of (J, # of nuclei) tuples.
+    resolution : float or None
+        if given, close lines are combined as the multiplet is built, moving
+        each line by less than this (Hz) (see ``first_order_spectrum``).
+    intensity_floor : float
+        lines weaker than this fraction of the strongest line are dropped as
+        the multiplet is built.
 
     Returns
     -------
-    [(float, float)...}
-        a plist-style spectrum (list of (frequency, intensity) tuples)
+    Spectrum
+        the (frequency, intensity) signals.
     """
-    return reduce_peaks(sorted(multiplet(signal, couplings)))
+    return binomial_multiplet(signal, couplings, resolution=resolution,
+                              intensity_floor=intensity_floor)
 
 
 def normalize_spectrum(spectrum, n=1):
@@ -426,14 +2782,20 @@ def normalize_spectrum(spectrum, n=1):
 
     Arguments
     ---------
-    spectrum : [(float, float)...]
-        a list of (frequency, intensity) tuples.
+    spectrum : Spectrum or [(float, float)...]
+        the (frequency, intensity) signals.
     n : int or float
         total intensity to normalize to.
+
+    Returns
+    -------
+    Spectrum
+        the normalized signals.
     """
-    freq, int_ = [x for x, y in spectrum], [y for x, y in spectrum]
-    _normalize(int_, n)
-    return list(zip(freq, int_))
+    spectrum = Spectrum(spectrum)
+    factor = n / spectrum.intensities.sum()
+    return Spectrum.from_columns(spectrum.frequencies,
+                                 spectrum.intensities * factor)
 
 
 ##############################################################################
@@ -467,8 +2829,8 @@ def AB(Jab, Vab, Vcentr, normalize=True):
 
     Returns
     -------
-    [(float, float)...]
-        a list of four (frequency, intensity) tuples.
+    Spectrum
+        the four (frequency, intensity) signals.
     """
     J = Jab
     dv = Vab
@@ -487,7 +2849,7 @@ def AB(Jab, Vab, Vcentr, normalize=True):
     IList = [I1, I2, I3, I4]
     if normalize:
         _normalize(IList, 2)
-    return list(zip(vList, IList))
+    return Spectrum.from_columns(vList, IList)
 
 
 def AB2(Jab, Vab, Vcentr, normalize=True):
@@ -508,8 +2870,8 @@ def AB2(Jab, Vab, Vcentr, normalize=True):
 
     Returns
     -------
-    [(float, float)...]
-        a list of (frequency, intensity) tuples.
+    Spectrum
+        the (frequency, intensity) signals.
     """
     # Currently, there is a disconnect between the variable names in the GUI
     # and the variable names in this function. The following code provides a
@@ -582,7 +2944,7 @@ def AB2(Jab, Vab, Vcentr, normalize=True):
     if normalize:
         _normalize(IList, 3)
 
-    return list(zip(vList, IList))
+    return Spectrum.from_columns(vList, IList)
 
 
 def ABX(Jab, Jbx, Jax, Vab, Vcentr, normalize=True):
@@ -594,7 +2956,7 @@ def ABX(Jab, Jbx, Jax, Vab, Vcentr, normalize=True):
     Wa is width of peak at half-height (not implemented yet)
     RightHz is the lower frequency limit for the window (not implemented yet)
     WdthHz is the width of the window in Hz (not implemented yet)
-    return: peaklist of (frequency, intensity) tuples
+    return: Spectrum of (frequency, intensity) signals
     Calculates signal frequencies and intensities for an ABX spin system.
 
     Arguments
@@ -615,8 +2977,8 @@ def ABX(Jab, Jbx, Jax, Vab, Vcentr, normalize=True):
 
     Returns
     -------
-    [(float, float)...]
-        a list of (frequency, intensity) tuples.
+    Spectrum
+        the (frequency, intensity) signals.
     """
     """
     In the WINDNMR main toolbar, only the parameters in the function args 
@@ -722,7 +3084,7 @@ def ABX(Jab, Jbx, Jax, Vab, Vcentr, normalize=True):
     IList = [I1, I2, I3, I4, I5, I6, I7, I8, I9, I10, I11, I12, I13, I14]
     if normalize:
         _normalize(IList, 3)
-    return list(zip(VList, IList))
+    return Spectrum.from_columns(VList, IList)
 
 
 def ABX3(Jab, Jax, Jbx, Vab, Vcentr, normalize=True):
@@ -749,26 +3111,26 @@ def ABX3(Jab, Jax, Jbx, Vab, Vcentr, normalize=True):
 
     Returns
     -------
-    [(float, float)...]
-        a list of (frequency, intensity) tuples.
+    Spectrum
+        the (frequency, intensity) signals.
     """
     #Refactoring of Reich's code for simulating the ABX3 system.
     va = Vcentr - Vab / 2
     vb = Vcentr + Vab / 2
     a_quartet = first_order((va, 1), [(Jax, 3)])
     b_quartet = first_order((vb, 1), [(Jbx, 3)])
-    res = []
+    res = Spectrum()
     for i in range(4):
         dv = b_quartet[i][0] - a_quartet[i][0]
         abcenter = (b_quartet[i][0] + a_quartet[i][0]) / 2
         sub_abq = AB(Jab, dv, abcenter, normalize)  # Wa, RightHz, WdthHz not
         # implemented
         scale_factor = a_quartet[i][1]
-        scaled_sub_abq = [(v, i * scale_factor) for v, i in sub_abq]
-        res.extend(scaled_sub_abq)
+        res += Spectrum.from_columns(sub_abq.frequencies,
+                                     sub_abq.intensities * scale_factor)
 
     if normalize:
-        _normalize(res, 5)  #TODO: check this factor
+        res = normalize_spectrum(res, 5)  #TODO: check this factor
     return res
 
 
@@ -792,8 +3154,8 @@ def AAXX(Jaa, Jxx, Jax, Jax_prime, Vcentr, normalize=True):
 
     Returns
     -------
-    [(float, float)...]
-        a list of (frequency, intensity) tuples.
+    Spectrum
+        the (frequency, intensity) signals.
     """
     # Define the constants required to calculate frequencies and intensities
 
@@ -845,7 +3207,7 @@ def AAXX(Jaa, Jxx, Jax, Jax_prime, Vcentr, normalize=True):
     if normalize:
         _normalize(IList, 4)
 
-    return list(zip(VList, IList))
+    return Spectrum.from_columns(VList, IList)
 
 
 def AABB(Vab, Jaa, Jbb, Jab, Jab_prime, Vcentr, normalize=True):
@@ -872,8 +3234,8 @@ def AABB(Vab, Jaa, Jbb, Jab, Jab_prime, Vcentr, normalize=True):
 
     Returns
     -------
-    [(float, float)...]
-        a list of (frequency, intensity) tuples.
+    Spectrum
+        the (frequency, intensity) signals.
     """
     va = Vcentr - Vab / 2
     vb = Vcentr + Vab / 2
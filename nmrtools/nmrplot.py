@@ -1,17 +1,25 @@
 """
 Provide functions for creating lineshapes suitable for plotting.
 
-For non-DNMR calculations, inputs are lists of (frequency, intensity) tuples,
-which then have Lorentzian distributions applied to them.
+For non-DNMR calculations, inputs are spectra (nmrmath.Spectrum objects, or
+lists of (frequency, intensity) tuples), which then have Lorentzian
+distributions applied to them.
 
 For DNMR calculations, the lineshapes are directly computed. Currently,
 non-quantum mechanical formulas for two uncoupled spins and for two coupled
 spins are used.
 """
+from collections.abc import Iterator
+from itertools import islice
+
 import numpy as np
 
 from .nmrmath import dnmr_AB, d2s_func
 
+# Maximum number of (peak, data point) Lorentzian evaluations that
+# add_signals performs in one array operation.
+_CHUNK_SIZE = 2 ** 20
+
 
 def lorentz(v, v0, I, w):
     """
@@ -45,19 +53,57 @@ def lorentz(v, v0, I, w):
             (0.5 * w) ** 2 / ((0.5 * w) ** 2 + (v - v0) ** 2))
 
 
+def _peak_chunks(peaklist, size):
+    """
+    Yields the (frequency, intensity) peaks of `peaklist` as (<= size, 2)
+    arrays. An iterator (e.g. from ``nmrmath.merge_sorted_peaks``) is
+    consumed lazily, one chunk at a time.
+    """
+    if isinstance(peaklist, Iterator):
+        while True:
+            block = list(islice(peaklist, size))
+            if not block:
+                return
+            yield np.array(block, dtype=float).reshape(-1, 2)
+    peaks = np.asarray(peaklist, dtype=float).reshape(-1, 2)
+    for start in range(0, len(peaks), size):
+        yield peaks[start:start + size]
+
+
+def _plot_limits(spectrum, margin=50):
+    """
+    Finds the x limits for plotting a spectrum: `margin` Hz beyond its
+    lowest and highest frequencies, found in one pass without sorting.
+
+    Returns
+    -------
+    (Spectrum or ndarray, (float, float))
+        the peaks (an iterator is consumed, and returned as an array) and
+        the (left, right) limits.
+    """
+    if isinstance(spectrum, Iterator):
+        spectrum = np.array(list(spectrum), dtype=float).reshape(-1, 2)
+    frequencies = np.asarray(spectrum, dtype=float).reshape(-1, 2)[:, 0]
+    return spectrum, (frequencies.min() - margin, frequencies.max() + margin)
+
+
 def add_signals(linspace, peaklist, w):
     """
-    Given a numpy linspace, a spectrum as a list of (frequency, intensity)
-    tuples, and a linewidth, returns an array of y coordinates for the
-    total line shape.
+    Given a numpy linspace, a spectrum, and a linewidth, returns an array of
+    y coordinates for the total line shape.
+
+    The Lorentzians for many peaks are evaluated at once, in chunks of
+    peaks small enough to bound the size of the temporary arrays. If
+    `peaklist` is an iterator, it is consumed chunk by chunk, so a streamed
+    spectrum never has to be held in memory in full.
 
     Arguments
     ---------
     linspace : array-like
         normally a numpy.linspace of x coordinates corresponding to frequency
         in Hz.
-    peaklist : [(float, float)...]
-        a list of (frequency, intensity) tuples.
+    peaklist : Spectrum, [(float, float)...] or iterator
+        the (frequency, intensity) signals.
     w : float
         peak width at half maximum intensity.
 
@@ -66,30 +112,37 @@ def add_signals(linspace, peaklist, w):
     [float...]
         an array of y coordinates corresponding to intensity.
     """
-    result = lorentz(linspace, peaklist[0][0], peaklist[0][1], w)
-    for v, i in peaklist[1:]:
-        result += lorentz(linspace, v, i, w)
+    x = np.asarray(linspace, dtype=float)
+    result = np.zeros(x.shape)
+    chunk = max(1, _CHUNK_SIZE // max(x.size, 1))
+    for peaks in _peak_chunks(peaklist, chunk):
+        v, i = peaks.T.reshape((2, -1) + (1,) * x.ndim)
+        result += lorentz(x, v, i, w).sum(axis=0)
     return result
 
 
-def nmrplot(spectrum, y=1):
+def nmrplot(spectrum, y=1, limits=None):
     """
     A no-frills routine that plots spectral simulation data.
 
     Arguments
     ---------
-    spectrum : [(float, float)...]
-        a list of (frequency, intensity) tuples.
+    spectrum : Spectrum, [(float, float)...] or iterator
+        the (frequency, intensity) signals, in any order.
     y : float
         maximum intensity for the plot.
+    limits : (float, float) or None
+        the (left, right) frequency limits; by default, 50 Hz beyond the
+        lowest and highest frequencies. With limits given, an iterator
+        (e.g. from ``nmrmath.merge_sorted_peaks``) is streamed.
     """
     """Oddball function. This is really a function for an application, 
     not a library. TODO: revise or eliminate."""
     import matplotlib.pyplot as plt
 
-    spectrum.sort()  # Could become costly with larger spectra
-    l_limit = spectrum[0][0] - 50
-    r_limit = spectrum[-1][0] + 50
+    if limits is None:
+        spectrum, limits = _plot_limits(spectrum)
+    l_limit, r_limit = limits
     x = np.linspace(l_limit, r_limit, 800)
     plt.ylim(-0.1, y)
     plt.gca().invert_xaxis()  # reverses the x axis
@@ -100,7 +153,7 @@ def nmrplot(spectrum, y=1):
     return
 
 
-def tkplot(spectrum, w=0.5):
+def tkplot(spectrum, w=0.5, limits=None):
     """Generate linspaces of x and y coordinates suitable for plotting on a
     matplotlib tkinter canvas.
 
@@ -108,19 +161,23 @@ def tkplot(spectrum, w=0.5):
 
     Arguments
     ---------
-    spectrum : [(float, float)...]
-        a list of (frequency, intensity) tuples.
+    spectrum : Spectrum, [(float, float)...] or iterator
+        the (frequency, intensity) signals, in any order.
     w : float
         peak width at half height
+    limits : (float, float) or None
+        the (left, right) frequency limits; by default, 50 Hz beyond the
+        lowest and highest frequencies. With limits given, an iterator
+        (e.g. from ``nmrmath.merge_sorted_peaks``) is streamed.
 
     Returns
     -------
     (ndarray, ndarray)
         a tuple of numpy.ndarrays for x and y coordinates
     """
-    spectrum.sort()
-    r_limit = spectrum[-1][0] + 50
-    l_limit = spectrum[0][0] - 50
+    if limits is None:
+        spectrum, limits = _plot_limits(spectrum)
+    l_limit, r_limit = limits
     x = np.linspace(l_limit, r_limit, 2400)
     y = add_signals(x, spectrum, w)
     return x, y
@@ -132,7 +189,7 @@ def tkplot_nmrmint(spectrum, w=0.5, spectrometer_frequency=300):
 
     Hard-coding a -1 to 15 ppm linspace, with resolution such that a 1 GHz
     spectrometer has 10 points per Hz.
-    :param spectrum: A list of (frequency, intensity) tuples
+    :param spectrum: A Spectrum or list of (frequency, intensity) tuples
     :param w: peak width at half height
     :param spectrometer_frequency: the frequency of the spectrometer (i.e
     frequency in MHz that 1H nuclei resonate at)
@@ -0,0 +1,115 @@
+"""
+Provides parallel execution of independent spectrum calculations.
+
+A large spectrum is often the sum of many independent parts, e.g. one
+``nmrmath.nspinspec`` call per molecular fragment plus ``nmrmath.first_order``
+multiplets. ``parallel_spectra`` spreads such jobs over a pool of worker
+processes::
+
+    jobs = [(nspinspec, (freqs1, J1)),
+            (nspinspec, (freqs2, J2), {'normalize': False}),
+            (first_order, ((1200, 3), [(7, 2)]))]
+    spectrum = parallel_spectrum(jobs)
+
+Each worker limits its BLAS/OpenMP libraries to `blas_threads` threads (1
+by default), so that N workers use N cores rather than N times the number
+of cores. Results are returned in the order of the jobs, whatever order the
+workers finish in.
+"""
+import multiprocessing
+import os
+
+import numpy as np
+
+from .nmrmath import Spectrum
+
+# Environment variables read by the common BLAS/OpenMP implementations when
+# they are loaded.
+_THREAD_VARIABLES = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS',
+                     'MKL_NUM_THREADS', 'BLIS_NUM_THREADS',
+                     'VECLIB_MAXIMUM_THREADS', 'NUMEXPR_NUM_THREADS')
+
+
+def _limit_threads(blas_threads):
+    """
+    Worker initializer: limits the BLAS thread pools that are already
+    loaded, if threadpoolctl is installed.
+    """
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        return  # the environment variables set by the parent still apply
+    threadpool_limits(blas_threads)
+
+
+def _run(job):
+    func, args, kwargs = (tuple(job) + ({},))[:3]
+    return func(*args, **kwargs)
+
+
+def parallel_spectra(jobs, max_workers=None, blas_threads=1, chunksize=1):
+    """
+    Runs independent spectrum calculations in a pool of worker processes.
+
+    Arguments
+    ---------
+    jobs : iterable of (callable, tuple) or (callable, tuple, dict)
+        the functions to call, with their positional and (optionally)
+        keyword arguments. The functions must be importable by the workers
+        (e.g. ``nmrmath.nspinspec`` or ``nmrmath.first_order``), and the
+        arguments picklable.
+    max_workers : int or None
+        the number of worker processes; by default, the number of CPUs. With
+        one worker (or one job), the jobs are run in this process.
+    blas_threads : int
+        the number of BLAS/OpenMP threads each worker may use.
+    chunksize : int
+        the number of jobs sent to a worker at a time; larger values reduce
+        the overhead for many small jobs.
+
+    Returns
+    -------
+    list
+        the result of each job, in the order of `jobs`.
+    """
+    jobs = list(jobs)
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = min(max_workers, len(jobs))
+    if max_workers <= 1:
+        return [_run(job) for job in jobs]
+
+    # Workers are started with the "spawn" method, so they load their BLAS
+    # libraries afresh and read these variables when they do.
+    saved = {name: os.environ.get(name) for name in _THREAD_VARIABLES}
+    os.environ.update({name: str(blas_threads) for name in _THREAD_VARIABLES})
+    try:
+        # (a multiprocessing pool rather than a ProcessPoolExecutor, whose
+        # mp_context and initializer arguments need Python 3.7)
+        with multiprocessing.get_context('spawn').Pool(
+                max_workers, _limit_threads, (blas_threads,)) as pool:
+            return pool.map(_run, jobs, chunksize)
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def parallel_spectrum(jobs, max_workers=None, blas_threads=1, chunksize=1):
+    """
+    Runs independent spectrum calculations in parallel (see
+    ``parallel_spectra``) and combines their signals into one spectrum.
+
+    Returns
+    -------
+    Spectrum
+        the signals of all jobs, in the order of `jobs` (empty if there
+        are no jobs).
+    """
+    results = parallel_spectra(jobs, max_workers, blas_threads, chunksize)
+    if not results:
+        return Spectrum()
+    return Spectrum(np.concatenate([Spectrum(result).peaks
+                                    for result in results]))
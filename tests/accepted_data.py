@@ -201,3 +201,105 @@ ADD_SIGNALS_DATASET = [(390.0, 0.0051387787470261702),
     (409.79899497487435, 0.0053578103445532949),
     (409.8994974874372, 0.0052465661367609943),
     (410.0, 0.0051387787470261702)]
+
+
+# accepted float64 output for nmrmath.nspinspec, using:
+#  freqs = [430.0, 265.0, 300.0, 310.0, 1105.0]
+#  J[0, 1] = 7.0, J[0, 2] = -12.5, J[1, 2] = 1.5, J[1, 3] = 8.0,
+#  J[2, 3] = 15.0, J[3, 4] = 0.8 (symmetric; all others 0)
+#  intensity_cutoff = 0.001, sorted by frequency
+NSPINSPEC_FLOAT64_DATASET = [(245.03884476264614, 0.00029086492463540047),
+    (245.0952170409919, 0.0013193516337873564),
+    (245.30135266023854, 0.0013775215525902661),
+    (245.61895418684318, 0.00031988247998261557),
+    (256.297216203165, 0.04808234216816823),
+    (256.30423271752153, 0.04825090720637457),
+    (260.26464272956923, 0.05445425002494),
+    (260.41034551457824, 0.05462170528087779),
+    (261.73342287676815, 0.05741706305556367),
+    (261.89072254661573, 0.05787050255731577),
+    (263.21183511143016, 0.051500607867059296),
+    (263.22240045147896, 0.05173470129319174),
+    (265.6794092990069, 0.05544304072203932),
+    (265.7244970667798, 0.05531764646584043),
+    (265.85050751270677, 0.07304121194994623),
+    (265.8551027588155, 0.07289105340530039),
+    (270.2685475553532, 0.06817747755608258),
+    (270.3304459067557, 0.06831184277446845),
+    (272.7851648352299, 0.0824829763409509),
+    (272.7914249544373, 0.08225242399186405),
+    (276.84241573110785, 0.004940734566768299),
+    (277.0601482351931, 0.004695554965169322),
+    (281.85679394221194, 0.010241564673696297),
+    (281.9840104304477, 0.011345397661171914),
+    (284.3694558975616, 0.025561138634510296),
+    (284.44101927797567, 0.026254261457518652),
+    (290.3740904352898, 0.002757351394628125),
+    (290.90920004850625, 0.00015763295952743496),
+    (290.9710104431165, 0.002534109673598489),
+    (294.65605275209884, 0.009895184472485398),
+    (294.869610060554, 0.011246879295998538),
+    (296.744548456299, 0.11442589914051292),
+    (296.8760528330969, 0.11289050979216224),
+    (299.2611657361757, 0.08144928887611291),
+    (299.33703188077845, 0.08085458711584496),
+    (301.96233682214853, 0.12203696197171482),
+    (302.6245749668085, 0.12082293744236085),
+    (305.4546717699875, 0.1443082207548699),
+    (305.65191629502533, 0.14304749233511962),
+    (305.8233671894035, 0.14404731046710828),
+    (306.0786257370836, 0.14285527221183622),
+    (309.0190492660716, 0.08013712081408686),
+    (309.5717564059261, 0.11378652135637204),
+    (309.73262042208523, 0.07979406115942916),
+    (309.7877474016032, 0.11309582856798851),
+    (311.08812296862845, 0.10887116348708975),
+    (311.66511556617786, 0.1078158734587404),
+    (316.8500913362356, 0.02161305988627366),
+    (317.51661736945766, 0.023044800900065932),
+    (320.99279287798083, 0.0002750457536852554),
+    (323.9107591046858, 0.02061929108533772),
+    (324.628633024888, 0.021573179697644124),
+    (326.00382662245573, 0.003535781585210338),
+    (326.58325290722706, 0.004499697164240359),
+    (405.7766573220045, 6.56996865560649e-05),
+    (409.0131335291579, 0.00903511295739007),
+    (409.31262329844657, 0.009621528065986014),
+    (412.80182028154906, 0.004240383599360644),
+    (413.30369748845817, 0.0046478547265683895),
+    (420.7063837092121, 0.07133288134537757),
+    (420.7080428646947, 0.0713352693344178),
+    (424.1825592177353, 0.060576694375719914),
+    (424.42161615278627, 0.0598437295573223),
+    (427.6427001872179, 0.06541306101932134),
+    (427.64270590483386, 0.06541027678225038),
+    (429.41816617838316, 0.055338433033512144),
+    (429.5973257871729, 0.06029699738166619),
+    (429.6536980655187, 0.05558954246404243),
+    (429.7357677049878, 0.05982488167555262),
+    (433.10774565125996, 0.05882845492293709),
+    (433.1077488357938, 0.05882660649957019),
+    (437.95329085696824, 0.052807039605218355),
+    (438.0934214256586, 0.053001082483850256),
+    (440.0223645595251, 0.0542368324434398),
+    (440.0259165697512, 0.05423508231941165),
+    (444.52715903272286, 0.005500536246090325),
+    (444.82312375409606, 0.005116185027627951),
+    (454.38536107349785, 0.002506276019440951),
+    (454.88892693128247, 0.0022527228447700807),
+    (1104.6001984098637, 0.0625697620363141),
+    (1104.6002015943973, 0.06256976277712503),
+    (1104.60721492422, 0.06256848087134946),
+    (1104.6107669344462, 0.06256760997220366),
+    (1104.6823303148603, 0.06255130908373267),
+    (1104.7274180826332, 0.0625368174858982),
+    (1104.8207722326752, 0.06250668535424961),
+    (1104.9664750176842, 0.062469392473499696),
+    (1105.0269078519218, 0.06245994127069264),
+    (1105.1842075217694, 0.062449544810745224),
+    (1105.2624397390573, 0.062452666753330555),
+    (1105.3243380904598, 0.062450390316239536),
+    (1105.3939441158552, 0.06244482764053215),
+    (1105.3956032713377, 0.06244463588065439),
+    (1105.4001985174466, 0.062443960345446796),
+    (1105.4002042350626, 0.06244396048072917)]
@@ -0,0 +1,63 @@
+import numpy as np
+from nmrtools.cache import SpectrumCache
+from nmrtools.nmrmath import Spectrum, nspinspec
+
+FREQS = [430, 265, 300]
+J = np.array([[0, 7, 15],
+              [7, 0, 1.5],
+              [15, 1.5, 0]])
+
+
+def test_cache_key_is_canonical():
+    cache = SpectrumCache(tolerance=1e-3)
+    key = cache.key(FREQS, J)
+    # relabeling the nuclei, or a change below the tolerance, gives the
+    # same key
+    order = [2, 0, 1]
+    assert cache.key([FREQS[i] for i in order], J[np.ix_(order, order)]) == key
+    assert cache.key([430.0001, 265, 300], J) == key
+    assert cache.key([431, 265, 300], J) != key
+    assert cache.key(FREQS, J, normalize=False) != key
+    # spins are relabeled along with the frequencies
+    spins = [0.5, 1, 0.5]
+    key = cache.key(FREQS, J, spins=spins)
+    assert cache.key([FREQS[i] for i in order], J[np.ix_(order, order)],
+                     spins=[spins[i] for i in order]) == key
+    assert cache.key(FREQS, J, spins=[1, 0.5, 0.5]) != key
+
+
+def test_nspinspec_cache_memory():
+    cache = SpectrumCache()
+    refspec = nspinspec(FREQS, J)
+    first = nspinspec(FREQS, J, cache=cache)
+    assert len(cache) == 1
+    second = nspinspec(FREQS, J, cache=cache)
+    assert isinstance(second, Spectrum)
+    assert second == first == refspec
+    # misses and hits are both read-only
+    assert not first.peaks.flags.writeable
+    assert not second.peaks.flags.writeable
+    assert refspec.peaks.flags.writeable
+
+
+def test_cache_lru_eviction():
+    spectrum = Spectrum([(100, 1), (110, 1)])
+    cache = SpectrumCache(max_bytes=2 * spectrum.peaks.nbytes)
+    cache.put('a', spectrum)
+    cache.put('b', spectrum)
+    cache.get('a')
+    cache.put('c', spectrum)
+    assert 'a' in cache and 'c' in cache
+    assert 'b' not in cache
+    assert cache.nbytes <= cache.max_bytes
+
+
+def test_nspinspec_cache_disk(tmp_path):
+    refspec = nspinspec(FREQS, J, cache=SpectrumCache(directory=str(tmp_path)))
+    # a new cache (e.g. in another process) finds the stored result
+    cache = SpectrumCache(directory=str(tmp_path))
+    key = cache.key(FREQS, J, normalize=True, intensity_cutoff=0.01,
+                    symmetry=True, window=None, weak_coupling=None,
+                    dtype='float64', refine=True)
+    assert key in cache and len(cache) == 0
+    assert nspinspec(FREQS, J, cache=cache) == refspec
@@ -1,9 +1,12 @@
 from nmrtools.nmrmath import *
 from nmrtools.nmrmath import _normalize  # temporary
+from nmrtools.nmrmath import _operator_terms
 import numpy as np
+from pytest import approx
 from scipy.sparse import lil_matrix
 from scipy.linalg import eigh
 from tests.testdata import TWOSPIN_SLOW, AB_WINDNMR
+from tests.accepted_data import NSPINSPEC_FLOAT64_DATASET
 # , TWOSPIN_COALESCE, TWOSPIN_FAST omitted for now
 
 # The attempt to put pytest code in a class failed. For whatever reason,
@@ -86,6 +89,35 @@ from tests.testdata import TWOSPIN_SLOW, AB_WINDNMR
 #         testspec = sorted(simsignals(hamiltonian(freqlist, J), 3))
 #         np.testing.assert_array_almost_equal(testspec, refspec, decimal=2)
 
+#############################################################################
+# Spectrum representation
+#############################################################################
+
+
+def test_spectrum_behaves_like_plist():
+    plist = [(300.0, 1.0), (100.0, 0.5), (200.0, 0.25)]
+    spectrum = Spectrum(plist)
+    assert len(spectrum) == 3
+    assert spectrum == plist
+    assert spectrum[1] == (100.0, 0.5)
+    assert list(spectrum) == plist
+    assert spectrum.tolist() == plist
+    assert sorted(spectrum) == sorted(plist)
+    spectrum.sort()
+    assert spectrum == sorted(plist)
+    assert spectrum + [(400.0, 1.0)] == sorted(plist) + [(400.0, 1.0)]
+    assert [(400.0, 1.0)] + spectrum == [(400.0, 1.0)] + sorted(plist)
+
+
+def test_spectrum_array_views():
+    spectrum = Spectrum.from_columns([100, 200], [1, 3])
+    assert spectrum.peaks.dtype == np.float64
+    assert spectrum.peaks.shape == (2, 2)
+    np.testing.assert_array_equal(np.asarray(spectrum), [[100, 1], [200, 3]])
+    spectrum.intensities[:] *= 2
+    assert spectrum.tolist() == [(100.0, 2.0), (200.0, 6.0)]
+
+
 #############################################################################
 # Second-Order (QM) Calculations
 #############################################################################
@@ -119,6 +151,16 @@ def test_transition_matrix():
     np.testing.assert_array_equal(T, transition_matrix(8).toarray())
 
 
+def test_transition_matrix_cached():
+    T = transition_matrix(2 ** 10)
+    assert T.format == 'csr'
+    assert T.nnz == 10 * 2 ** 10
+    assert transition_matrix(2 ** 10) is T
+    assert not T.data.flags.writeable
+    assert not T.indices.flags.writeable
+    assert not T.indptr.flags.writeable
+
+
 def test_hamiltonian():
     # Not a very clear test. TODO: refactor into multiple, clear tests
     freqlist = [430, 265, 300]
@@ -140,6 +182,22 @@ def test_hamiltonian():
     np.testing.assert_array_almost_equal(eigvals, v, decimal=3)
 
 
+def test_hamiltonian_cached_terms():
+    rng = np.random.RandomState(0)
+    J = rng.uniform(-15, 15, (4, 4))  # not symmetric
+    H1 = hamiltonian([430, 265, 300, 150], J)
+    H2 = hamiltonian([100, 200, 300, 400], J)
+    terms = _operator_terms(4)
+    assert _operator_terms(4) is terms
+    assert not any(term.flags.writeable for term in terms)
+    # self-couplings only shift the energies
+    shift = 0.375 * np.trace(J) * np.eye(16)
+    np.testing.assert_array_almost_equal(
+        H1, bitwise_hamiltonian([430, 265, 300, 150], J) + shift)
+    np.testing.assert_array_almost_equal(
+        H2, bitwise_hamiltonian([100, 200, 300, 400], J) + shift)
+
+
 def test_simsignals():
     # this is more of an integration test than a unit test
     # TODO: split into smaller unit tests, and create a test for nspinspic
@@ -167,6 +225,343 @@ def test_simsignals():
     np.testing.assert_array_almost_equal(testspec, refspec, decimal=2)
 
 
+def test_simsignals_intensity_cutoff():
+    freqlist = [430, 265, 300]
+    J = np.zeros((3, 3))
+    J[0, 1] = 7
+    J[0, 2] = 15
+    J[1, 2] = 1.5
+    J = J + J.T
+    H = hamiltonian(freqlist, J)
+    spectrum = simsignals(H, 3, intensity_cutoff=1.0)
+    assert np.all(spectrum.intensities > 1.0)
+    assert len(spectrum) == 5
+    assert len(simsignals(H, 3, intensity_cutoff=0.0)) > len(simsignals(H, 3))
+
+
+def test_simsignals_sector_kernel():
+    # 9 spins: intensities only computed between adjacent Mz blocks
+    rng = np.random.RandomState(0)
+    freqlist = rng.uniform(0, 500, 9)
+    J = rng.uniform(-15, 15, (9, 9))
+    J = J + J.T
+    testspec = sorted(simsignals(bitwise_hamiltonian(freqlist, J), 9))
+    refspec = sorted(block_simsignals(freqlist, J))
+    np.testing.assert_array_almost_equal(testspec, refspec, decimal=6)
+
+
+def test_simsignals_iterative_eigensolvers():
+    rng = np.random.RandomState(0)
+    freqlist = rng.uniform(0, 1000, 10)
+    J = rng.uniform(-15, 15, (10, 10))
+    J = J + J.T
+    np.fill_diagonal(J, 0)
+    H = bitwise_hamiltonian(freqlist, J, sparse=True)
+    refspec = simsignals(H, 10)
+    E0 = H.diagonal().max()
+    for solver in [krylov_eigensolver(60),
+                   krylov_eigensolver(40, sigma=[E0, E0 - freqlist[0]]),
+                   lobpcg_eigensolver(20)]:
+        testspec = simsignals(H, 10, eigensolver=solver)
+        assert len(testspec) > 10
+        # every signal from the partial eigensolution is in the spectrum
+        for v, i in testspec:
+            nearest = np.argmin(np.abs(refspec.frequencies - v))
+            assert refspec.frequencies[nearest] == approx(v, abs=1e-6)
+            assert refspec.intensities[nearest] == approx(i, abs=1e-6)
+
+
+def test_block_simsignals_iterative_eigensolvers():
+    rng = np.random.RandomState(0)
+    freqlist = rng.uniform(0, 1000, 10)
+    J = rng.uniform(-15, 15, (10, 10))
+    J = J + J.T
+    np.fill_diagonal(J, 0)
+    refspec = block_simsignals(freqlist, J)
+    refspec.sort()
+    # all eigenpairs of every block
+    testspec = block_simsignals(freqlist, J, eigensolver=krylov_eigensolver(
+        300))
+    testspec.sort()
+    np.testing.assert_array_almost_equal(testspec, refspec)
+    # the lowest eigenpairs of every block
+    for solver in [krylov_eigensolver(20), lobpcg_eigensolver(20)]:
+        testspec = block_simsignals(freqlist, J, eigensolver=solver)
+        assert len(testspec) > 10
+        for v, i in testspec:
+            nearest = np.argmin(np.abs(refspec.frequencies - v))
+            assert refspec.frequencies[nearest] == approx(v, abs=1e-6)
+            assert refspec.intensities[nearest] == approx(i, abs=1e-6)
+
+
+def test_bitwise_hamiltonian():
+    freqlist = [430, 265, 300, 150]
+    J = np.zeros((4, 4))
+    J[0, 1] = 7
+    J[0, 2] = 15
+    J[1, 2] = 1.5
+    J[2, 3] = 8
+    J = J + J.T
+    H = hamiltonian(freqlist, J)
+    np.testing.assert_array_almost_equal(bitwise_hamiltonian(freqlist, J), H)
+    H_csr = bitwise_hamiltonian(freqlist, J, sparse=True)
+    assert H_csr.format == 'csr'
+    np.testing.assert_array_almost_equal(H_csr.toarray(), H)
+
+
+def test_mz_blocks():
+    blocks = mz_blocks(3)
+    assert [list(block) for block in blocks] == [[0], [1, 2, 4], [3, 5, 6],
+                                                 [7]]
+
+
+def test_block_simsignals():
+    freqlist = [430, 265, 300, 150, 110]
+    J = np.zeros((5, 5))
+    J[0, 1] = 7
+    J[0, 2] = 15
+    J[1, 2] = 1.5
+    J[2, 3] = 8
+    J[3, 4] = 12
+    J[1, 4] = 3
+    J = J + J.T
+    refspec = sorted(simsignals(hamiltonian(freqlist, J), 5))
+    testspec = sorted(block_simsignals(freqlist, J))
+    np.testing.assert_array_almost_equal(testspec, refspec, decimal=6)
+
+
+def test_symmetric_simsignals():
+    # ethyl group coupled to one more proton: CH3 and CH2 are magnetically
+    # equivalent groups
+    freqs = [100, 100, 100, 130, 130, 160]
+    J = np.zeros((6, 6))
+    J[:3, 3:5] = 7
+    J[3:5, 5] = 5
+    J[:3, 5] = 1.2
+    J[0, 1] = J[0, 2] = J[1, 2] = -12
+    J = J + J.T
+    testspec = symmetric_simsignals(freqs, J, intensity_cutoff=0)
+    refspec = block_simsignals(freqs, J, intensity_cutoff=0)
+    assert len(testspec) < len(refspec)
+    # degenerate signals are combined, so compare the lineshapes
+    from nmrtools.nmrplot import add_signals
+    x = np.linspace(50, 200, 1500)
+    np.testing.assert_array_almost_equal(add_signals(x, testspec, 0.5),
+                                         add_signals(x, refspec, 0.5))
+
+
+def test_nspinspec_window():
+    freqs = [430, 265, 300, 120, 125]
+    J = np.zeros((5, 5))
+    J[0, 1] = 7
+    J[0, 2] = 15
+    J[1, 2] = 1.5
+    J[3, 4] = 8
+    J[2, 3] = 2
+    J = J + J.T
+    full = nspinspec(freqs, J, normalize=False)
+    inside = (full.frequencies >= 250) & (full.frequencies <= 320)
+    refspec = sorted(full[inside])
+    testspec = sorted(nspinspec(freqs, J, normalize=False, window=(250, 320)))
+    np.testing.assert_array_almost_equal(testspec, refspec, decimal=6)
+    # normalized intensities are on the scale of the full spectrum
+    windowed = nspinspec(freqs, J, window=(0, 1000))
+    assert windowed.intensities.sum() == approx(5, rel=1e-3)
+
+
+def test_weak_coupling_simsignals():
+    # AX: first-order doublets
+    testspec = sorted(weak_coupling_simsignals([100, 400], [[0, 5], [5, 0]],
+                                               0.05))
+    refspec = [(97.5, 1), (102.5, 1), (397.5, 1), (402.5, 1)]
+    np.testing.assert_array_almost_equal(testspec, refspec)
+
+    # two strongly coupled AB clusters, weakly coupled to each other and to
+    # a CH3 group
+    freqs = [100, 110, 400, 408, 800, 800, 800]
+    J = np.zeros((7, 7))
+    J[0, 1] = 12
+    J[2, 3] = 10
+    J[1, 2] = 3
+    J[0, 3] = 1
+    J[2, 4:] = 1
+    J[3, 4:] = 1.5
+    J = J + J.T
+    refspec = nspinspec(freqs, J)
+    testspec = nspinspec(freqs, J, weak_coupling=0.05)
+    assert testspec.intensities.sum() == approx(7)
+    from nmrtools.nmrplot import add_signals
+    x = np.linspace(50, 850, 8000)
+    y_ref = add_signals(x, refspec, 1)
+    y_test = add_signals(x, testspec, 1)
+    assert np.abs(y_test - y_ref).max() < 0.05 * y_ref.max()
+
+
+def test_nspinspec_batch():
+    freqs = np.array([[430, 265, 300], [120, 135, 400], [50, 60, 70]])
+    J = np.zeros((3, 3, 3))
+    J[:, 0, 1] = [7, 12, -3]
+    J[:, 0, 2] = [15, 0, 8]
+    J[:, 1, 2] = [1.5, 6, 10]
+    J = J + J.transpose(0, 2, 1)
+    spectra = nspinspec_batch(freqs, J)
+    assert len(spectra) == 3
+    for f, j, spectrum in zip(freqs, J, spectra):
+        assert isinstance(spectrum, Spectrum)
+        refspec = sorted(nspinspec(f, j))
+        testspec = sorted(map(tuple, spectrum))
+        np.testing.assert_array_almost_equal(testspec, refspec, decimal=6)
+
+
+def test_field_sweep():
+    shifts = [1.2, 1.25, 3.6, 3.7]
+    J = np.zeros((4, 4))
+    J[0, 2], J[1, 3], J[2, 3], J[0, 1] = 7, 7, -12, 0.5
+    J = J + J.T
+    fields = [60, 300, 900]
+    spectra = field_sweep(shifts, J, fields)
+    assert len(spectra) == 3
+    for field, spectrum in zip(fields, spectra):
+        assert isinstance(spectrum, Spectrum)
+        refspec = sorted(nspinspec(np.multiply(shifts, field), J,
+                                   symmetry=False))
+        np.testing.assert_array_almost_equal(sorted(spectrum), refspec,
+                                             decimal=6)
+
+
+def test_spin_system_updates():
+    rng = np.random.RandomState(0)
+    freqs = np.sort(rng.uniform(300, 3000, 8))
+    J = np.zeros((8, 8))
+    for i in range(7):
+        J[i, i + 1] = rng.uniform(2, 8)
+    J = J + J.T
+    system = SpinSystem(freqs, J)
+    assert system.full_solves == 9
+    for change in [(3, 0.5), (0, 20)]:
+        i, dv = change
+        freqs[i] += dv
+        system.set_frequency(i, freqs[i])
+        J[2, 3] = J[3, 2] = J[2, 3] + 0.3
+        system.set_coupling(2, 3, J[2, 3])
+        testspec = sorted(system.spectrum())
+        refspec = sorted(nspinspec(freqs, J, symmetry=False))
+        np.testing.assert_array_almost_equal(testspec, refspec, decimal=3)
+    # the 70 x 70 block was updated rather than re-solved
+    assert system.full_solves < 9 + 4 * 9
+
+
+def test_spin_operators():
+    freqs = [10, 20, 30]
+    J = np.zeros((3, 3))
+    J[0, 2] = J[2, 0] = 5
+    spins = [0.5, 1, 1.5]
+    Iz, Iplus, Iminus = spin_operators(spins)
+    H = (sum(v * I for v, I in zip(freqs, Iz))
+         + 5 * (Iz[0].dot(Iz[2])
+                + 0.5 * (Iplus[0].dot(Iminus[2]) + Iminus[0].dot(Iplus[2]))))
+    np.testing.assert_array_almost_equal(H.toarray(),
+                                         spin_hamiltonian(freqs, J, spins))
+    np.testing.assert_array_almost_equal(
+        spin_hamiltonian(freqs, J, [0.5] * 3), hamiltonian(freqs, J))
+    # for spin-1/2 nuclei, the allowed transitions are those of
+    # transition_matrix
+    initial, final, amplitude = allowed_transitions([0.5] * 3)
+    T = transition_matrix(8)
+    assert sorted(zip(initial, final)) == sorted(
+        (i, j) for i, j in zip(*T.nonzero()) if i < j)
+    assert np.all(amplitude == 1)
+    initial, final, amplitude = allowed_transitions(spins)
+    assert len(initial) == 2 * 3 * 4 - 3 * 4 + 2 * 2 * 4 + 2 * 3 * 3
+    np.testing.assert_array_almost_equal(
+        Iminus[1].toarray()[final, initial] + Iminus[0].toarray()[
+            final, initial] + Iminus[2].toarray()[final, initial], amplitude)
+
+
+def test_nspinspec_spins():
+    # a proton coupled to a deuteron: a 1:1:1 triplet
+    J = np.array([[0, 2], [2, 0]])
+    spectrum = nspinspec([400, 60], J, spins=[0.5, 1])
+    proton = spectrum[spectrum.frequencies > 200]
+    np.testing.assert_array_almost_equal(sorted(proton.frequencies),
+                                         [398, 400, 402], decimal=1)
+    np.testing.assert_allclose(proton.intensities / proton.intensities[0],
+                               [1, 1, 1], rtol=0.05)
+    # CHD2: a 1:2:3:2:1 quintet, with or without symmetry
+    J = np.zeros((3, 3))
+    J[0, 1:] = J[1:, 0] = 2
+    for symmetry in [True, False]:
+        spectrum = nspinspec([400, 60, 60], J, spins=[0.5, 1, 1],
+                             symmetry=symmetry, intensity_cutoff=1e-6)
+        proton = spectrum[spectrum.frequencies > 200]
+        lines = np.round(proton.frequencies)
+        quintet = [proton.intensities[lines == v].sum()
+                   for v in [396, 398, 400, 402, 404]]
+        np.testing.assert_allclose(np.array(quintet) / quintet[0],
+                                   [1, 2, 3, 2, 1], rtol=0.05)
+    # the symmetric, block and windowed paths agree
+    freqs = [400, 380, 60, 60]
+    J = np.zeros((4, 4))
+    J[0, 1] = J[1, 0] = 10
+    J[:2, 2:] = J[2:, :2] = 2
+    spins = [0.5, 0.5, 1, 1]
+    refspec = sorted(nspinspec(freqs, J, spins=spins, symmetry=False))
+    testspec = sorted(nspinspec(freqs, J, spins=spins))
+    np.testing.assert_array_almost_equal(reduce_peaks(testspec, 1e-6),
+                                         reduce_peaks(refspec, 1e-6),
+                                         decimal=4)
+    window = sorted(nspinspec(freqs, J, spins=spins, window=(300, 500)))
+    assert np.all(np.asarray(window)[:, 0] > 300)
+    assert (sum(i for _, i in window)
+            == approx(sum(i for v, i in refspec if v > 300), rel=1e-3))
+
+
+def test_nspinfid():
+    from nmrtools.nmrplot import add_signals
+    freqs = [430, 265, 300]
+    J = np.zeros((3, 3))
+    J[0, 1], J[0, 2], J[1, 2] = 7, 15, 1.5
+    J = J + J.T
+    x, y = nspinfid(freqs, J, points=4096, linewidth=1)
+    assert np.all(np.diff(x) > 0)
+    refspec = nspinspec(freqs, J, intensity_cutoff=1e-9)
+    np.testing.assert_allclose(y, add_signals(x, refspec, 1), atol=1e-3)
+    # random-phase state vectors instead of the exact trace
+    rng = np.random.RandomState(0)
+    freqs = rng.uniform(0, 300, 6)
+    J = np.zeros((6, 6))
+    for i in range(5):
+        J[i, i + 1] = J[i + 1, i] = rng.uniform(2, 8)
+    x, y = nspinfid(freqs, J, points=1024, linewidth=2, nvectors=64)
+    Y = add_signals(x, nspinspec(freqs, J, intensity_cutoff=1e-9), 2)
+    assert np.abs(y - Y).max() < 0.1 * Y.max()
+
+
+def test_nspinspec_single_precision():
+    freqs = [430.0, 265.0, 300.0, 310.0, 1105.0]
+    J = np.zeros((5, 5))
+    J[0, 1], J[0, 2], J[1, 2] = 7.0, -12.5, 1.5
+    J[1, 3], J[2, 3], J[3, 4] = 8.0, 15.0, 0.8
+    J = J + J.T
+    refspec = np.array(NSPINSPEC_FLOAT64_DATASET)
+    for refine, max_error in [(False, 1e-3), (True, 1e-8)]:
+        testspec = nspinspec(freqs, J, intensity_cutoff=0.001,
+                             dtype=np.float32, refine=refine)
+        testspec.sort()
+        assert len(testspec) == len(refspec)
+        error = np.abs(testspec.frequencies - refspec[:, 0]).max()
+        assert error < max_error
+        np.testing.assert_allclose(testspec.intensities, refspec[:, 1],
+                                   atol=1e-5)
+    H = hamiltonian(freqs, J, dtype=np.float32)
+    assert H.dtype == np.float32
+    testspec = simsignals(H, 5, intensity_cutoff=0.001)
+    testspec.sort()
+    assert len(testspec) == len(refspec)
+    np.testing.assert_allclose(testspec.frequencies, refspec[:, 0],
+                               atol=1e-3)
+
+
 #############################################################################
 # First-Order Calculations
 #############################################################################
@@ -231,6 +626,62 @@ def test_reduce_peaks():
     np.testing.assert_array_almost_equal(testspec, refspec, decimal=2)
 
 
+def test_merge_peaks():
+    rng = np.random.RandomState(0)
+    peaks = np.column_stack((rng.uniform(0, 100, 500), rng.uniform(0, 1, 500)))
+    testspec = merge_peaks(peaks, 0.5)
+    assert np.all(np.diff(testspec.frequencies) > 0.5)
+    assert testspec.intensities.sum() == approx(peaks[:, 1].sum())
+    # intensity-weighted average frequencies; peaks are merged in chains
+    testspec = merge_peaks([(10.4, 1), (10, 3), (10.8, 1), (20, 2)], 0.5)
+    np.testing.assert_array_almost_equal(testspec,
+                                         [(10.24, 5), (20, 2)])
+    # a tolerance of 0.002 ppm at 300 MHz is 0.6 Hz
+    testspec = merge_peaks([(100, 1), (100.5, 1), (101.2, 1)], 0.002, 300)
+    np.testing.assert_array_almost_equal(testspec,
+                                         [(100.25, 2), (101.2, 1)])
+    assert len(merge_peaks([])) == 0
+
+
+def test_merge_sorted_peaks():
+    rng = np.random.RandomState(0)
+    spectra = [Spectrum(np.column_stack((np.sort(rng.uniform(0, 100, n)),
+                                         rng.uniform(0, 1, n))))
+               for n in rng.randint(0, 50, 20)]
+    merged = merge_sorted_peaks(iter(spectra), 0.3)
+    assert not isinstance(merged, (list, Spectrum))
+    refspec = merge_peaks(np.concatenate(spectra), 0.3)
+    np.testing.assert_array_almost_equal(list(merged), refspec)
+    assert list(merge_sorted_peaks([[(1, 1), (2, 1)], [(2, 1)]])) == [
+        (1, 1), (2, 2)]
+    # the stream converts back to a Spectrum
+    spectrum = Spectrum(merge_sorted_peaks(spectra, 0.3))
+    np.testing.assert_array_almost_equal(spectrum, refspec)
+    np.testing.assert_array_almost_equal(
+        merge_peaks(merge_sorted_peaks(spectra), 0.3), refspec)
+    assert normalize_spectrum(iter([(1, 1), (2, 3)])) == Spectrum(
+        [(1, 0.25), (2, 0.75)])
+    assert len(Spectrum(iter([]))) == 0
+
+
+def test_merge_sorted_peaks_is_lazy():
+    import tracemalloc
+    rng = np.random.RandomState(0)
+    spectra = [Spectrum(np.column_stack((np.sort(rng.uniform(0, 100, 20000)),
+                                         rng.uniform(0, 1, 20000))))
+               for _ in range(20)]
+    nbytes = sum(spectrum.peaks.nbytes for spectrum in spectra)
+    tracemalloc.start()
+    try:
+        merged = merge_sorted_peaks(spectra)
+        next(merged)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    # the spectra are not converted to Python objects up front
+    assert peak < nbytes / 4
+
+
 def test_normalize():
     intensities = [1, 3, 4]
     _normalize(intensities)
@@ -257,6 +708,103 @@ def test_first_order():
     np.testing.assert_array_almost_equal(testspec, refspec, decimal=2)
 
 
+def test_binomial_multiplet():
+    # a septet of doublets of triplets
+    couplings = [(7, 6), (10, 1), (2.5, 2)]
+    testspec = binomial_multiplet((1200, 2), couplings)
+    assert len(testspec) == 7 * 2 * 3
+    assert np.all(np.diff(testspec.frequencies) > 0)
+    refspec = multiplet((1200, 2), couplings)
+    refspec.sort()
+    refspec = reduce_peaks(refspec, 1e-9)
+    np.testing.assert_array_almost_equal(testspec, refspec)
+    # any iterable of couplings
+    np.testing.assert_array_almost_equal(
+        binomial_multiplet((1200, 2), iter(couplings)), testspec)
+    np.testing.assert_array_almost_equal(
+        first_order((1200, 2), (c for c in couplings)), testspec)
+    # overlapping lines (J1 = 2 * J2) are combined
+    testspec = binomial_multiplet((100, 1), [(10, 1), (5, 2)])
+    np.testing.assert_array_almost_equal(
+        testspec, [(90, 0.125), (95, 0.25), (100, 0.25), (105, 0.25),
+                   (110, 0.125)])
+
+
+def test_first_order_spectrum():
+    # one, two and three couplings per signal
+    signals = [(1200, 2), (450, 2), (300, 3), (800, 1)]
+    couplings = [(7, 2), (7, 2), (7, 3), (10, 1), (5, 2), (1.5, 1), (3, 3)]
+    indptr = [0, 1, 3, 6, 7]
+    testspec = first_order_spectrum(signals, couplings, indptr)
+    refspecs = []
+    for signal, start, stop in zip(signals, indptr[:-1], indptr[1:]):
+        refspec = multiplet(signal, couplings[start:stop])
+        refspec.sort()
+        refspecs.append(reduce_peaks(refspec, 1e-9))
+    np.testing.assert_array_almost_equal(testspec,
+                                         np.concatenate(refspecs))
+    # a signal without couplings is a singlet
+    testspec = first_order_spectrum([(100, 1), (200, 2)], [(10, 1)],
+                                    [0, 0, 1])
+    np.testing.assert_array_almost_equal(
+        testspec, [(100, 1), (195, 1), (205, 1)])
+
+
+def test_first_order_pruning():
+    from nmrtools.nmrplot import add_signals
+    rng = np.random.RandomState(1)
+    couplings = [(7, 2), (3, 1)] + [(J, 1) for J in rng.uniform(0.1, 0.5, 12)]
+    refspec = first_order((300, 1), couplings)
+    testspec = first_order((300, 1), couplings, resolution=0.05,
+                           intensity_floor=1e-3)
+    assert len(testspec) < len(refspec) / 20
+    assert np.all(np.diff(testspec.frequencies) > 0)
+    assert testspec.intensities.sum() == approx(1, rel=1e-3)
+    x = np.linspace(280, 320, 2000)
+    y_ref = add_signals(x, refspec, 0.5)
+    assert np.abs(add_signals(x, testspec, 0.5) - y_ref).max() < (
+        0.01 * y_ref.max())
+    # the floor is relative to the strongest line of each signal
+    testspec = first_order_spectrum([(100, 1), (200, 10)], [(10, 6), (10, 6)],
+                                    [0, 1, 2], intensity_floor=0.1)
+    np.testing.assert_array_almost_equal(
+        testspec.frequencies, [80, 90, 100, 110, 120, 180, 190, 200, 210, 220])
+    # close lines are combined wherever they fall, into runs narrower than
+    # the resolution, and a symmetric multiplet stays symmetric
+    testspec = first_order((0, 1), [(0.002, 1)], resolution=0.1)
+    np.testing.assert_array_almost_equal(testspec, [(0, 1)])
+    testspec = first_order((300, 1), [(0.03, 4)], resolution=0.05)
+    np.testing.assert_array_almost_equal(
+        testspec, [(299.964, 0.3125), (300, 0.375), (300.036, 0.3125)])
+    # the lines move by less than the resolution in all, however many
+    # couplings are applied
+    refspec = first_order((300, 1), [(0.04, 1)] * 10)
+    testspec = first_order((300, 1), [(0.04, 1)] * 10, resolution=0.05)
+    np.testing.assert_array_almost_equal(testspec.frequencies - 300,
+                                         300 - testspec.frequencies[::-1])
+    assert testspec.frequencies.min() < refspec.frequencies.min() + 0.05
+    assert testspec.frequencies.max() > refspec.frequencies.max() - 0.05
+
+
+def test_first_order_pruning_speed():
+    import time
+    # many signals with few runs each: the cost of pruning must not grow
+    # with the number of signals times the number of runs
+    signals = np.column_stack((np.arange(5000) * 10.0, np.ones(5000)))
+    couplings = np.tile([7.0, 2.0], (5000, 1))
+    indptr = np.arange(5001)
+
+    def best_time(resolution):
+        times = []
+        for _ in range(5):
+            start = time.perf_counter()
+            first_order_spectrum(signals, couplings, indptr,
+                                 resolution=resolution)
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    assert best_time(1.0) < 20 * best_time(None)
+
 #############################################################################
 # Non-QM Second-Order Calculations
 #############################################################################
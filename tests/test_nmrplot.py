@@ -1,7 +1,8 @@
 import numpy as np
 from pytest import approx
-from nmrtools.nmrplot import (lorentz, add_signals,
+from nmrtools.nmrplot import (lorentz, add_signals, tkplot,
                                      dnmrplot_2spin, dnmrplot_AB)
+from nmrtools.nmrmath import Spectrum, merge_sorted_peaks
 from tests import testdata
 from tests.accepted_data import ADD_SIGNALS_DATASET
 from tests.plottools import popplot
@@ -36,6 +37,43 @@ def test_add_signals():
     assert np.array_equal(y, Y)
 
 
+def test_add_signals_spectrum():
+    """Tests that add_signals accepts a Spectrum without conversion."""
+    x = np.linspace(390, 410, 200)
+    plist = [(399, 1), (401, 1), (405, 0.5)]
+    y = add_signals(x, Spectrum(plist), 1)
+    np.testing.assert_array_almost_equal(y, add_signals(x, plist, 1))
+    Y = sum(lorentz(x, v, i, 1) for v, i in plist)
+    np.testing.assert_array_almost_equal(y, Y)
+
+
+def test_add_signals_iterator(monkeypatch):
+    """Tests that add_signals consumes an iterator of peaks in chunks."""
+    import nmrtools.nmrplot
+    monkeypatch.setattr(nmrtools.nmrplot, '_CHUNK_SIZE', 400)
+    x = np.linspace(390, 410, 200)
+    plist = [(399, 1), (401, 1), (405, 0.5), (407, 0.25), (408, 1)]
+    y = add_signals(x, iter(plist), 1)
+    np.testing.assert_array_almost_equal(y, add_signals(x, plist, 1))
+
+
+def test_tkplot():
+    """Tests that tkplot takes unsorted, sorted and streamed spectra."""
+    plist = [(405, 0.5), (399, 1), (401, 1)]
+    spectrum = Spectrum(plist)
+    x, y = tkplot(spectrum)
+    assert x[0] == 349 and x[-1] == 455
+    assert spectrum == Spectrum(plist)  # not sorted in place
+    x2, y2 = tkplot(iter(sorted(plist)))
+    np.testing.assert_array_almost_equal(x2, x)
+    np.testing.assert_array_almost_equal(y2, y)
+    # a merged stream, with the limits given
+    stream = merge_sorted_peaks([[(399, 1), (405, 0.5)], [(401, 1)]])
+    x3, y3 = tkplot(stream, limits=(349, 455))
+    np.testing.assert_array_almost_equal(x3, x)
+    np.testing.assert_array_almost_equal(y3, y)
+
+
 def test_dnmrplot_2spin_slowexchange():
 
     WINDNMR_DEFAULT = (165.00, 135.00, 1.50, 0.50, 0.50, 0.50)
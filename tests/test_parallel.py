@@ -0,0 +1,34 @@
+import numpy as np
+from nmrtools.nmrmath import Spectrum, first_order, nspinspec
+from nmrtools.parallel import parallel_spectra, parallel_spectrum
+
+J = np.array([[0, 7, 15],
+              [7, 0, 1.5],
+              [15, 1.5, 0]])
+JOBS = [(nspinspec, ([430, 265, 300], J)),
+        (nspinspec, ([120, 135, 400], J), {'normalize': False}),
+        (first_order, ((1200, 3), [(7, 2)]))]
+
+
+def test_parallel_spectra_order():
+    serial = parallel_spectra(JOBS, max_workers=1)
+    parallel = parallel_spectra(JOBS, max_workers=2)
+    assert len(parallel) == len(JOBS)
+    for a, b in zip(serial, parallel):
+        assert a == b
+
+
+def test_parallel_spectrum():
+    spectrum = parallel_spectrum(JOBS, max_workers=2)
+    assert isinstance(spectrum, Spectrum)
+    refspec = (nspinspec([430, 265, 300], J)
+               + nspinspec([120, 135, 400], J, normalize=False)
+               + first_order((1200, 3), [(7, 2)]))
+    assert spectrum == refspec
+
+
+def test_parallel_spectrum_no_jobs():
+    assert parallel_spectra([]) == []
+    spectrum = parallel_spectrum([])
+    assert isinstance(spectrum, Spectrum)
+    assert len(spectrum) == 0
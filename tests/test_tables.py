@@ -0,0 +1,49 @@
+import numpy as np
+from nmrtools.nmrmath import AB, AB2, ABX, AAXX, Spectrum
+from nmrtools.tables import pattern_table
+
+
+def test_two_parameter_tables():
+    rng = np.random.RandomState(0)
+    for pattern, function in [('AB', AB), ('AB2', AB2)]:
+        table = pattern_table(pattern)
+        J, dv = rng.uniform(-20, 20, (2, 50))
+        center = rng.uniform(100, 500, 50)
+        frequencies, intensities = table(J, dv, center)
+        assert frequencies.shape == intensities.shape == (50, table.nlines)
+        for k in range(50):
+            refspec = function(J[k], dv[k], center[k])
+            np.testing.assert_allclose(frequencies[k], refspec.frequencies,
+                                       atol=1e-4)
+            np.testing.assert_allclose(intensities[k], refspec.intensities,
+                                       atol=1e-4)
+
+
+def test_four_parameter_tables():
+    rng = np.random.RandomState(0)
+    for pattern, function in [('ABX', ABX), ('AAXX', AAXX)]:
+        table = pattern_table(pattern)
+        params = rng.uniform(-20, 20, (200, 4))
+        # a strongly coupled AB part with nearly coincident lines
+        params[0] = -1.08, -14.98, 10.92, 13.66
+        frequencies, intensities = table(*params.T, 300)
+        for p, v, i in zip(params, frequencies, intensities):
+            refspec = function(*p, 300)
+            np.testing.assert_allclose(v, refspec.frequencies, atol=5e-3)
+            np.testing.assert_allclose(i, refspec.intensities, atol=1e-3)
+
+
+def test_pattern_table_broadcasting():
+    table = pattern_table('AB')
+    assert pattern_table('AB') is table
+    # one coupling constant, a range of chemical shift differences
+    dv = np.linspace(0, 30, 7)
+    frequencies, intensities = table(12, dv, 150)
+    assert frequencies.shape == (7, 4)
+    spectrum = table.spectrum(12, 15, 150)
+    assert isinstance(spectrum, Spectrum)
+    np.testing.assert_allclose(spectrum.peaks, AB(12, 15, 150).peaks,
+                               atol=1e-4)
+    # all parameters zero: every line at the center
+    frequencies, _ = table(0, 0, 150)
+    np.testing.assert_allclose(frequencies, 150)